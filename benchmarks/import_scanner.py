@@ -0,0 +1,73 @@
+"""
+Import scanner benchmark: token scan vs. full AST parse.
+
+    python benchmarks/import_scanner.py [DIR ...]
+
+Scans every .py file under DIR (default: the standard library) with both
+strategies, checks that they agree, and reports total time per strategy.
+A synthetic "generated module" (large data literal) is always included,
+since that is where skipping the AST pays off most.
+"""
+import sys
+import sysconfig
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from codigest.core import resolver
+
+
+def generated_module(entries: int = 50_000) -> bytes:
+    rows = "".join(f"    'key_{i}': ({i}, {i * 2.5}, 'value_{i}'),\n" for i in range(entries))
+    return f"from .schema import Record\nimport json\n\nDATA = {{\n{rows}}}\n".encode()
+
+
+def load_corpus(dirs: list[Path]) -> list[tuple[str, bytes]]:
+    corpus = [("<generated>", generated_module())]
+    for directory in dirs:
+        for path in sorted(directory.rglob("*.py")):
+            try:
+                data = path.read_bytes()
+                resolver.scan_imports_ast(data)
+            except Exception:
+                # Invalid code: the strategies are only required to agree on valid files
+                continue
+            corpus.append((str(path), data))
+    return corpus
+
+
+def run(strategy: str, corpus: list[tuple[str, bytes]]) -> tuple[float, list]:
+    start = time.perf_counter()
+    results = [resolver.scan_imports(data, strategy) for _, data in corpus]
+    return time.perf_counter() - start, results
+
+
+def main():
+    dirs = [Path(arg) for arg in sys.argv[1:]] or [Path(sysconfig.get_paths()["stdlib"])]
+    corpus = load_corpus(dirs)
+    size_mb = sum(len(data) for _, data in corpus) / 1024 / 1024
+    print(f"{len(corpus)} files, {size_mb:.1f} MB")
+
+    timings = {}
+    outputs = {}
+    for strategy in resolver.IMPORT_SCANNERS:
+        timings[strategy], outputs[strategy] = run(strategy, corpus)
+        print(f"  {strategy:<7} {timings[strategy]:7.2f}s")
+
+    mismatches = [
+        name for (name, _), a, b in zip(corpus, outputs["tokens"], outputs["ast"]) if a != b
+    ]
+    print(f"  speedup {timings['ast'] / timings['tokens']:.2f}x, mismatches: {len(mismatches)}")
+    for name in mismatches[:10]:
+        print(f"    {name}")
+
+    gen_data = corpus[0][1]
+    for strategy in resolver.IMPORT_SCANNERS:
+        start = time.perf_counter()
+        resolver.scan_imports(gen_data, strategy)
+        print(f"  <generated> {strategy:<7} {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ from pathlib import Path
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn
 
-from ..core import prompts, shadow, tags, common
+from ..core import prompts, tags, common
 
 app = typer.Typer()
 console = Console()
@@ -33,7 +33,7 @@ def handle(
     ctx = common.get_context(target)
     root_path = ctx.root_path
     
-    anchor = shadow.ContextAnchor(root_path)
+    anchor = ctx.get_anchor()
 
     # Check Baseline
     last_update = anchor.get_last_update_time()
@@ -4,11 +4,14 @@ from pathlib import Path
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn
 
-from ..core import structure, prompts, semdiff, tags, tokenizer, common
+from ..core import structure, prompts, semdiff, tags, common
 
 app = typer.Typer()
 console = Console()
 
+# Files keyed and parsed per batch (bounds the file contents held at once)
+BATCH_SIZE = 2048
+
 @app.callback(invoke_without_command=True)
 def handle(
     target: Path = typer.Argument(Path.cwd(), help="Target directory"),
@@ -17,6 +20,7 @@ def handle(
     message: str = typer.Option("", "--message", "-m", help="Add specific instruction"),
     # [추가]
     resolve: bool = typer.Option(False, "-r", "--resolve", help="Recursively resolve imports"),
+    jobs: int = typer.Option(0, "--jobs", "-j", help="Parser processes (0 = one per CPU)"),
 ):
     """
     [Architectural View] Summarizes the codebase structure (Classes/Functions only).
@@ -41,23 +45,34 @@ def handle(
         
         tree_str = structure.generate_ascii_tree(files, root_path)
 
+        # Content keys first (stat-cached), then one batched lookup:
+        # cache hits cost nothing, misses are parsed on the process pool
+        py_files = []
+        symbol_tables = []
+        candidates = [f for f in files if f.suffix in (".py", ".pyi")]
+        for start in range(0, len(candidates), BATCH_SIZE):
+            requests = []
+            for file_path in candidates[start:start + BATCH_SIZE]:
+                try:
+                    requests.append(semdiff.symbol_request(ctx.index, file_path))
+                except OSError:
+                    continue
+                py_files.append(file_path)
+            symbol_tables += semdiff.load_symbols_many(requests, ctx.cache, jobs=jobs)
+        ctx.index.save()
+        ctx.cache.save()
+
         summary_blocks = []
-        for file_path in files:
-            if file_path.suffix in (".py", ".pyi"):
+        for file_path, symbols in zip(py_files, symbol_tables):
+            summary = semdiff.summarize_symbols(symbols)
+            if summary:
                 try:
-                    content = file_path.read_text(encoding="utf-8")
-                    summary = semdiff.summarize(content)
-                    
-                    if summary:
-                        try:
-                            rel_path = file_path.relative_to(root_path).as_posix()
-                        except ValueError:
-                            rel_path = f"[EXTERNAL]/{file_path.name}"
+                    rel_path = file_path.relative_to(root_path).as_posix()
+                except ValueError:
+                    rel_path = f"[EXTERNAL]/{file_path.name}"
 
-                        block = tags.file(rel_path, summary)
-                        summary_blocks.append(block)
-                except Exception:
-                    continue
+                block = tags.file(rel_path, summary)
+                summary_blocks.append(block)
 
         summary_blob = "\n".join(summary_blocks)
         
@@ -75,7 +90,7 @@ def handle(
             
         progress.update(task, completed=100)
 
-    token_count = tokenizer.estimate_tokens(digest_content)
+    token_count = ctx.tokenizer.count(digest_content)
     console.print(f"[bold green]Digest Generated![/bold green] ([bold cyan]~{token_count:,} Tokens[/bold cyan])")
     
     if copy:
@@ -3,7 +3,7 @@ from pathlib import Path
 from rich.console import Console
 from rich.panel import Panel
 
-from ..core import scanner, shadow
+from ..core import scanner, common
 
 app = typer.Typer()
 console = Console()
@@ -14,6 +14,7 @@ description = "Auto-generated context configuration"
 
 [filter]
 max_file_size_kb = 100 
+large_file_policy = "truncate"  # Files above the limit: include | truncate | excerpt (head + tail) | skip
 extensions = [
     ".py", ".pyi",
     ".ts", ".tsx", ".js", ".jsx",
@@ -28,8 +29,39 @@ exclude_patterns = [
     "__pycache__/"
 ]
 
+[scan]
+backend = "auto"  # auto | walk | git (git ls-files fast path)
+workers = 1  # Directory walker threads (>1 fans out subtrees)
+read_workers = 1  # Snapshot file-reading threads (raise to 4-8 on network filesystems / cold caches)
+process_workers = 0  # Processes for numbering/escaping big files (0 = off)
+
+[resolve]
+import_scanner = "tokens"  # tokens (token stream, no AST) | ast (full parse)
+jobs = 0  # Import-scanner processes per BFS level (0 = one per CPU, small levels run inline)
+max_depth = -1  # Import hops followed by -r (-1 = unlimited)
+token_budget = 0  # Stop adding dependencies at ~N estimated tokens (0 = unlimited)
+
+[anchor]
+mode = "objects"  # objects (no worktree copy) | worktree (mirror files in .codigest/anchor)
+
+[semdiff]
+ignore_docstrings = false  # true: docstring-only edits are not reported as logic changes
+
+[cache]
+max_size_mb = 64  # .codigest/cache.db (parsed symbols etc.), least recently used entries are evicted
+
+[tokenizer]
+backend = "heuristic"  # estimate (chars/4) | heuristic (cl100k-style, offline) | tiktoken (exact, optional extra)
+encoding = "cl100k_base"  # tiktoken encoding
+
+[pack]
+max_tokens = 0  # scan --max-tokens default (0 = off): fit the snapshot into N tokens
+priority = ["target", "distance", "recent", "size"]  # Packing order; files that do not fit become digests
+
 [output]
 format = "xml"
+shard_tokens = 0  # Split snapshots into snapshot.001.xml, ... of at most N tokens (0 = single file)
+shard_kb = 0  # ... or at most N KB per shard (0 = off)
 structure = "toon"
 """
 
@@ -76,7 +108,7 @@ def handle(
     try:
         # Default scan settings for initialization
         files = scanner.scan_project(root_path) 
-        anchor = shadow.ContextAnchor(root_path)
+        anchor = common.get_context(root_path).get_anchor()
         anchor.update(files)
         console.print("  [green]✔[/green] Baseline snapshot captured.")
     except Exception as e:
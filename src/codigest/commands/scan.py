@@ -5,11 +5,44 @@ from rich.progress import Progress, SpinnerColumn, TextColumn
 from rich.panel import Panel
 from rich.filesize import decimal
 
-from ..core import structure, tags, prompts, processor, shadow, tokenizer, common
+from ..core import structure, prompts, snapshot, common, sniff, packer
 
 app = typer.Typer()
 console = Console()
 
+def _resolve_summary(ctx: common.ProjectContext, root_path: Path) -> str:
+    """Pre-flight lines about dependencies left out by --max-depth/--token-budget."""
+    result = ctx.last_resolve
+    if result is None or not result.frontier:
+        return ""
+    shown = []
+    for p in result.frontier[:5]:
+        try:
+            shown.append(p.relative_to(root_path).as_posix())
+        except ValueError:
+            shown.append(p.name)
+    more = f", +{len(result.frontier) - 5} more" if len(result.frontier) > 5 else ""
+    return (
+        f"\n  [yellow]Deps cut off ({result.cut_by}): {len(result.frontier)}[/yellow]"
+        f"\n  [dim]Next: {', '.join(shown)}{more}[/dim]"
+    )
+
+def _pack_signals(ctx: common.ProjectContext, files: list[Path], targets, anchor, sizes: dict) -> packer.PackSignals:
+    """Ranking inputs for --max-tokens: scope, import distance, anchor changes, mtime, size."""
+    changed = set()
+    if anchor.has_history():
+        try:
+            changed = set(anchor.get_changed_files(files))
+        except Exception:
+            pass
+    return packer.PackSignals(
+        targets=list(targets or []),
+        depths=ctx.last_resolve.depths if ctx.last_resolve is not None else {},
+        changed=changed,
+        mtimes={f: ctx.index.stat(f).mtime_ns for f in files},
+        sizes=sizes,
+    )
+
 @app.callback(invoke_without_command=True)
 def handle(
     targets: list[Path] = typer.Argument(
@@ -24,6 +57,11 @@ def handle(
     line_numbers: bool = typer.Option(False, "--lines", "-l", help="Add line numbers to code blocks"),
     yes: bool = typer.Option(False, "-y", "--yes", help="Skip confirmation prompt"),
     resolve: bool = typer.Option(False, "-r", "--resolve", help="Recursively resolve imports for local files"),
+    max_depth: int = typer.Option(None, "--max-depth", help="With -r: follow at most N import hops"),
+    token_budget: int = typer.Option(None, "--token-budget", help="With -r: stop adding dependencies at ~N tokens"),
+    max_tokens: int = typer.Option(None, "--max-tokens", help="Fit the snapshot into N tokens (priority files in full, then digests)"),
+    shard_tokens: int = typer.Option(None, "--shard-tokens", help="Split the snapshot into shards of at most N tokens"),
+    shard_kb: int = typer.Option(None, "--shard-kb", help="Split the snapshot into shards of at most N KB"),
 ):
     """
     Scans the codebase. 
@@ -45,7 +83,7 @@ def handle(
 
     output_path = artifact_dir / output
     prompt_engine = prompts.get_engine(root_path)
-    anchor = shadow.ContextAnchor(root_path)
+    anchor = ctx.get_anchor()
 
     # [2] File Discovery via Context
     with Progress(
@@ -60,21 +98,87 @@ def handle(
         files = ctx.get_target_files(
             targets=targets, 
             ignore_config=all, 
-            resolve_deps=resolve
+            resolve_deps=resolve,
+            max_depth=max_depth,
+            token_budget=token_budget
         )
         
         progress.update(task, completed=100)
 
     # [3] Pre-flight Check
+    # Large-file policy from the (index-cached) sizes: skipped files already left the
+    # file list (get_target_files), truncated/excerpted ones only count up to the limit
+    policy = ctx.size_policy
+    sizes = {f: ctx.index.stat(f).size for f in files}
+    # Text/binary verdicts (sniffed once, then cached in the index):
+    # binaries become a size/type placeholder and are never read
+    kinds = {f: ctx.index.content_kind(f) for f in files}
+    texts = {f for f in files if kinds[f] == sniff.TEXT}
+    actions: dict[str, int] = {}
+    if ctx.skipped_files:
+        actions["skip"] = len(ctx.skipped_files)
+    for f in texts:
+        if policy.max_bytes and sizes[f] > policy.max_bytes:
+            action = policy.action_for(sizes[f])
+            actions[action] = actions.get(action, 0) + 1
+
     total_files = len(files)
-    total_size = sum(f.stat().st_size for f in files)
-    est_tokens = int(total_size / 4) 
+    binaries = sum(1 for f in files if f not in texts)
+    total_size = sum(policy.output_size(sizes[f]) for f in files if f in texts)
+    # Per-file counts (cached by content hash); truncated/excerpted files are
+    # counted from the bounded text the snapshot keeps
+    file_tokens = ctx.token_counter.count_many([f for f in files if f in texts])
+    est_tokens = sum(file_tokens.values())
+
+    try:
+        template = prompt_engine.render_stream(
+            "snapshot",
+            ["tree_structure", "source_code"],
+            project_name=root_path.name,
+            instruction=message
+        )
+    except Exception as e:
+        console.print(f"[red][Error] Template Rendering Failed:[/red] {e}")
+        raise typer.Exit(1)
+
+    # Token-budget packing: the plan holds the exact block for every packed file
+    budget = max_tokens if max_tokens is not None else ctx.pack.max_tokens
+    plan = None
+    if budget:
+        ranked = packer.rank_files(files, ctx.pack.priority, _pack_signals(ctx, files, targets, anchor, sizes))
+        pack = packer.SnapshotPacker(
+            root_path,
+            snapshot.BlockLoader(root_path, line_numbers, policy=policy, kinds=kinds),
+            ctx.tokenizer,
+            template,
+            index=ctx.index,
+            cache=ctx.cache,
+            jobs=ctx.resolve.jobs
+        )
+        plan = pack.pack(ranked, budget, list(structure.iter_ascii_tree(files, root_path)), lower_bounds=file_tokens)
+        est_tokens = plan.tokens
+    ctx.index.save()
+    ctx.cache.save()
+
+    large_files = ""
+    if actions:
+        summary = ", ".join(f"{count} {action}" for action, count in sorted(actions.items()))
+        large_files = f"\n  Large Files (> {policy.max_bytes // 1024} KB): [yellow]{summary}[/yellow]"
+    if binaries:
+        large_files += f"\n  Binary Files: [dim]{binaries} (placeholders)[/dim]"
+    if plan is not None:
+        large_files += (
+            f"\n  Budget: ~{budget:,} tokens -> [green]{len(plan.full)} full[/green], "
+            f"[cyan]{len(plan.digested)} digest[/cyan], [yellow]{len(plan.omitted)} omitted[/yellow]"
+        )
+        if plan.tokens > budget:
+            large_files += "\n  [red]Template and tree alone exceed the budget[/red]"
 
     console.print(Panel(f"""[bold]Scan Plan[/bold]
   Target: [cyan]{root_path}[/cyan]
   Scope: {total_files} files
   Est. Size: {decimal(total_size)}
-  Est. Tokens: ~{est_tokens:,}""", expand=False))
+  Est. Tokens: ~{est_tokens:,}{large_files}{_resolve_summary(ctx, root_path)}""", expand=False))
 
     TOKEN_THRESHOLD = 30000   
     FILE_COUNT_THRESHOLD = 100
@@ -82,6 +186,8 @@ def handle(
 
     if yes:
         pass 
+    elif plan is not None:
+        console.print("[dim]Packed to fit the token budget. Automatically proceeding...[/dim]")
     elif is_large_context:
         console.print(f"[yellow][Warning] Large context detected (> {TOKEN_THRESHOLD:,} tokens or > {FILE_COUNT_THRESHOLD} files).[/yellow]")
         if not typer.confirm("Proceed with digestion?"):
@@ -90,6 +196,10 @@ def handle(
     else:
         console.print("[dim]Small context detected. Automatically proceeding...[/dim]")
 
+    # Sharded output: CLI limits override [output] shard_tokens / shard_kb
+    shard_limit_tokens = shard_tokens if shard_tokens is not None else ctx.output.shard_tokens
+    shard_limit_kb = shard_kb if shard_kb is not None else ctx.output.shard_kb
+
     # [4] Execution
     with Progress(
         SpinnerColumn(),
@@ -107,54 +217,74 @@ def handle(
             except Exception:
                 pass
 
-        tree_str = structure.generate_ascii_tree(files, root_path)
-
-        file_blocks = []
-        for file_path in files:
-            try:
-                rel_path = file_path.relative_to(root_path).as_posix()
-            except ValueError:
-                rel_path = f"[EXTERNAL]/{file_path.name}"
-
-            try:
-                content = processor.read_file_content(file_path, add_line_numbers=line_numbers)
-                block = tags.file(rel_path, content)
-                file_blocks.append(block)
-            except Exception:
-                continue
-
-        source_code_blob = "\n\n".join(file_blocks)
-
-        try:
-            snapshot_content = prompt_engine.render(
-                "snapshot",
-                project_name=root_path.name,
-                tree_structure=tree_str,
-                source_code=source_code_blob,
-                instruction=message
+        # Tree lines and file blocks are streamed straight to disk
+        if plan is not None:
+            # Packed: tree lists every candidate, blocks in tree order (full or digest)
+            file_blocks = (plan.blocks[f] for f in files if f in plan.blocks)
+        else:
+            file_blocks = snapshot.iter_file_blocks(
+                files,
+                root_path,
+                line_numbers=line_numbers,
+                workers=ctx.scan.read_workers,
+                process_workers=ctx.scan.process_workers,
+                policy=policy,
+                kinds=kinds
             )
+        try:
+            if shard_limit_tokens or shard_limit_kb:
+                stats = snapshot.write_sharded_snapshot(
+                    output_path,
+                    template,
+                    tree_lines=structure.iter_ascii_tree(files, root_path),
+                    file_blocks=file_blocks,
+                    token_backend=ctx.tokenizer,
+                    max_tokens=shard_limit_tokens,
+                    max_bytes=shard_limit_kb * 1024
+                )
+            else:
+                stats = snapshot.write_snapshot(
+                    output_path,
+                    template,
+                    tree_lines=structure.iter_ascii_tree(files, root_path),
+                    file_blocks=file_blocks,
+                    token_backend=ctx.tokenizer
+                )
         except Exception as e:
-            console.print(f"[red][Error] Template Rendering Failed:[/red] {e}")
+            console.print(f"[bold red][Error] Save Failed:[/bold red] {e}")
             raise typer.Exit(1)
 
+    # Which candidates went in full / as digests / not at all (packed runs only)
+    pack_manifest = packer.manifest_path(output_path)
     try:
+        if plan is not None:
+            packer.write_manifest(output_path, plan, root_path)
+        else:
+            pack_manifest.unlink(missing_ok=True)
+    except OSError as e:
+        console.print(f"[yellow][Warning] Failed to write the packing manifest: {e}[/yellow]")
+
+    try:
+        # Every candidate is anchored, packed or not: the next diff shows only real changes
         anchor.update(files)
     except Exception as e:
         console.print(f"[yellow][Warning] Failed to update context anchor: {e}[/yellow]")
 
-    try:
-        output_path.write_text(snapshot_content, encoding="utf-8")
-        final_token_count = tokenizer.estimate_tokens(snapshot_content)
-
-        console.print("[bold green]Snapshot Saved![/bold green]")
+    console.print("[bold green]Snapshot Saved![/bold green]")
+    if isinstance(stats, snapshot.ShardedStats):
+        console.print(f"  Manifest: [underline]{stats.manifest}[/underline]")
+        for shard in stats.shards:
+            console.print(f"  [dim]{shard.path}: ~{shard.tokens:,} tokens, {decimal(shard.bytes)}, {len(shard.files)} blocks[/dim]")
+            if shard.oversized:
+                console.print(f"  [yellow]{shard.path} exceeds the limit (unsplittable: {', '.join(shard.oversized)})[/yellow]")
+    else:
         console.print(f"  Path: [underline]{output_path}[/underline]")
-        console.print(f"  Final Tokens: [bold cyan]~{final_token_count:,}[/bold cyan]")
-        
-        if anchor.has_history():
-            pre_diff_path = artifact_dir / "previous_changes.diff"
-            if pre_diff_path.exists() and pre_diff_path.stat().st_size > 0:
-                console.print(f"  [dim]Changes before this scan saved to: {pre_diff_path.name}[/dim]")
+    if plan is not None:
+        console.print(f"  Packing: [underline]{pack_manifest}[/underline]")
+    console.print(f"  Size: {decimal(stats.bytes)} ({stats.files} files)")
+    console.print(f"  Final Tokens: [bold cyan]~{stats.tokens:,}[/bold cyan]")
 
-    except Exception as e:
-        console.print(f"[bold red][Error] Save Failed:[/bold red] {e}")
-        raise typer.Exit(1)
\ No newline at end of file
+    if anchor.has_history():
+        pre_diff_path = artifact_dir / "previous_changes.diff"
+        if pre_diff_path.exists() and pre_diff_path.stat().st_size > 0:
+            console.print(f"  [dim]Changes before this scan saved to: {pre_diff_path.name}[/dim]")
\ No newline at end of file
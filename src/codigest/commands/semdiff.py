@@ -4,11 +4,14 @@ from pathlib import Path
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn
 
-from ..core import prompts, shadow, semdiff, tags, tokenizer, common
+from ..core import prompts, semdiff, tags, common
 
 app = typer.Typer()
 console = Console()
 
+def _anchor_reader(reader, oid: str):
+    return lambda: reader.read_object(oid) or b""
+
 @app.callback(invoke_without_command=True)
 def handle(
     target: Path = typer.Argument(Path.cwd(), help="Target directory"),
@@ -17,6 +20,7 @@ def handle(
     message: str = typer.Option("", "--message", "-m", help="Add specific instruction"),
     # [추가] resolve 옵션
     resolve: bool = typer.Option(False, "-r", "--resolve", help="Recursively resolve imports"),
+    jobs: int = typer.Option(0, "--jobs", "-j", help="Parser processes (0 = one per CPU)"),
 ):
     """
     [Advanced] Generates a Semantic Diff (AST-based) report.
@@ -26,7 +30,7 @@ def handle(
     ctx = common.get_context(target)
     root_path = ctx.root_path
     
-    anchor = shadow.ContextAnchor(root_path)
+    anchor = ctx.get_anchor()
 
     last_update = anchor.get_last_update_time()
     if last_update == "Never":
@@ -48,61 +52,61 @@ def handle(
         # [2] Get Files via Context
         current_files = ctx.get_target_files(resolve_deps=resolve)
 
-        # Only check files that have text changes first (Optimization)
-        changed_files_paths = anchor.get_changed_files(list(current_files))
-
-        target_files = []
-        for p in changed_files_paths:
-            if p.suffix in (".py", ".pyi"):
-                target_files.append(p)
-
-        # [3] Compare Each File
-        for file_path in target_files:
-            # Handle Path String (Support External Files)
-            try:
-                rel_path = file_path.relative_to(root_path)
-                rel_path_str = rel_path.as_posix()
-            except ValueError:
-                # External files tracked via resolve logic
-                rel_path = None # Anchor might not support reading external files yet
-                rel_path_str = f"[EXTERNAL]/{file_path.name}"
-            
-            # Read New Content
-            try:
-                new_code = file_path.read_text(encoding="utf-8") if file_path.exists() else ""
-            except:
-                new_code = ""
-            
-            # Read Old Content (From Anchor)
-            # Note: Anchor only stores files inside root. External files will likely return empty old_code.
-            if rel_path:
-                old_code = anchor.read_anchor_file(rel_path)
-            else:
-                old_code = "" 
-
-            changes = semdiff.compare(old_code, new_code)
-
-            if changes:
-                change_lines = []
-                for ch in changes:
-                    if ch.change_type == "ADDED": icon = "➕ [ADDED]   "
-                    elif ch.change_type == "REMOVED": icon = "➖ [REMOVED] "
-                    elif ch.change_type == "MODIFIED": icon = "⚠️ [SIGNATURE]"
-                    else: icon = "✏️ [LOGIC]   "
-                    
-                    detail = f" :: {ch.details}" if ch.details else ""
-                    line = f"{icon} {ch.symbol.type} {ch.symbol.name}{ch.symbol.signature}{detail}"
-                    change_lines.append(line)
-
-                # File Status Tag
-                file_status = ""
-                if not new_code: file_status = " (DELETED)"
-                elif not old_code: file_status = " (NEW)"
-
+        # Structured change list (blob ids only, no text diff)
+        file_changes = [
+            ch for ch in anchor.get_file_changes(list(current_files))
+            if Path(ch.path).suffix in (".py", ".pyi")
+        ]
+
+        # [semdiff] ignore_docstrings: docstring-only edits are not logic changes
+        ignore_docstrings = bool(ctx.config.get("semdiff", {}).get("ignore_docstrings", False))
+
+        # [3] Symbol Tables (both sides, one batch)
+        # Cache hits (keyed by blob id) cost nothing; misses are read here -
+        # baselines through one long-lived cat-file process - and parsed on the process pool
+        with anchor.open_reader() as reader:
+            requests = []
+            for change in file_changes:
+                if change.status != "DELETED":
+                    requests.append((change.new_oid, semdiff.file_reader(root_path / change.path)))
+                if change.old_oid:
+                    requests.append((change.old_oid, _anchor_reader(reader, change.old_oid)))
+
+            tables = iter(semdiff.load_symbols_many(requests, ctx.cache, ignore_docstrings, jobs=jobs))
+
+        ctx.cache.save()
+
+        # [4] Compare Each File (same order as the requests)
+        for change in file_changes:
+            new_syms = next(tables) if change.status != "DELETED" else {}
+            old_syms = next(tables) if change.old_oid else {}
+
+            changes = semdiff.compare_symbols(old_syms, new_syms)
+
+            change_lines = []
+            for ch in changes:
+                if ch.change_type == "ADDED": icon = "➕ [ADDED]   "
+                elif ch.change_type == "REMOVED": icon = "➖ [REMOVED] "
+                elif ch.change_type == "MODIFIED": icon = "⚠️ [SIGNATURE]"
+                else: icon = "✏️ [LOGIC]   "
+
+                detail = f" :: {ch.details}" if ch.details else ""
+                line = f"{icon} {ch.symbol.type} {ch.symbol.name}{ch.symbol.signature}{detail}"
+                change_lines.append(line)
+
+            # File Status Tag
+            file_status = ""
+            if change.status == "DELETED": file_status = " (DELETED)"
+            elif change.status == "ADDED": file_status = " (NEW)"
+            elif change.status == "RENAMED":
+                file_status = " (RENAMED)"
+                change_lines.insert(0, f"Renamed from {change.old_path}")
+
+            if change_lines:
                 raw_body = chr(10).join(change_lines)
-                
+
                 # Use unified tags factory
-                block = tags.file(rel_path_str, raw_body, status=file_status)
+                block = tags.file(change.path, raw_body, status=file_status)
                 reports.append(block)
 
         progress.update(task, completed=100)
@@ -111,7 +115,7 @@ def handle(
         console.print("[green]No structural (AST) changes detected.[/green]")
         return
 
-    # [4] Render
+    # [5] Render
     report_content = "\n".join(reports)
     prompt_engine = prompts.get_engine(root_path)
 
@@ -127,7 +131,7 @@ def handle(
         console.print(f"[red]Template Error:[/red] {e}")
         raise typer.Exit(1)
 
-    token_count = tokenizer.estimate_tokens(final_output)
+    token_count = ctx.tokenizer.count(final_output)
     console.print(f"[bold green]SemDiff Generated![/bold green] ([bold cyan]~{token_count:,} Tokens[/bold cyan])")
     
     if copy:
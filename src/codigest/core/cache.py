@@ -0,0 +1,155 @@
+"""
+Content-Addressed Cache (.codigest/cache.db).
+Generic SQLite key/value store for derived data (symbol tables, import lists, ...).
+  - Keys are content hashes (git blob ids), so entries never go stale:
+    a changed file simply maps to a new key.
+  - Each consumer writes into its own versioned namespace ("symbols:v1"),
+    bumping the version orphans old entries, which eviction then reclaims.
+  - Eviction is LRU by last access, bounded by total size and entry count.
+Access times and new entries are buffered in memory and flushed by save().
+"""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+from loguru import logger
+
+CACHE_FILENAME = "cache.db"
+SCHEMA_VERSION = 1
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 200_000
+
+_Key = tuple[str, str]
+
+
+class ContentCache:
+    def __init__(
+            self,
+            db_path: Optional[Path] = None,
+            max_bytes: int = DEFAULT_MAX_BYTES,
+            max_entries: int = DEFAULT_MAX_ENTRIES
+            ):
+        """db_path=None keeps entries in memory for this run only."""
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._pending: dict[_Key, bytes] = {}
+        self._touched: set[_Key] = set()
+        self._conn = self._connect()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self.db_path is None:
+            return None
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                conn.executescript(f"""
+                    DROP TABLE IF EXISTS entries;
+                    CREATE TABLE entries (
+                        namespace TEXT, key TEXT, value BLOB, size INTEGER, atime INTEGER,
+                        PRIMARY KEY (namespace, key)
+                    );
+                    CREATE INDEX entries_atime ON entries (atime);
+                    PRAGMA user_version = {SCHEMA_VERSION};
+                """)
+            return conn
+        except sqlite3.Error as e:
+            logger.warning(f"Content cache unavailable ({e}), continuing without it.")
+            return None
+
+    # --- Raw access ---------------------------------------------------------
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        if not key:
+            return None
+        item = (namespace, key)
+        with self._lock:
+            value = self._pending.get(item)
+            if value is not None or self._conn is None:
+                return value
+            try:
+                row = self._conn.execute(
+                    "SELECT value FROM entries WHERE namespace = ? AND key = ?", item
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.debug(f"Content cache read failed: {e}")
+                return None
+            if row is None:
+                return None
+            self._touched.add(item)
+            return row[0]
+
+    def put(self, namespace: str, key: str, value: bytes):
+        if not key:
+            return
+        with self._lock:
+            self._pending[(namespace, key)] = value
+
+    # --- JSON helpers -------------------------------------------------------
+
+    def get_json(self, namespace: str, key: str) -> Any:
+        """Decoded entry, None on a miss (or an unreadable entry)."""
+        raw = self.get(namespace, key)
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def put_json(self, namespace: str, key: str, value: Any):
+        self.put(namespace, key, json.dumps(value, separators=(",", ":")).encode("utf-8"))
+
+    # --- Persistence --------------------------------------------------------
+
+    def save(self):
+        """Flushes new entries and access times, then evicts down to the limits."""
+        if self._conn is None:
+            # In-memory mode: pending entries are the store
+            return
+        with self._lock:
+            if not (self._pending or self._touched):
+                return
+            now = time.time_ns()
+            rows = [(ns, key, value, len(value), now) for (ns, key), value in self._pending.items()]
+            touched = [(now, ns, key) for ns, key in self._touched]
+            self._pending.clear()
+            self._touched.clear()
+            try:
+                with self._conn:
+                    self._conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", rows)
+                    self._conn.executemany(
+                        "UPDATE entries SET atime = ? WHERE namespace = ? AND key = ?", touched
+                    )
+                    self._evict()
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to save content cache: {e}")
+
+    def _evict(self):
+        """Drops least recently used entries until both limits hold."""
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        doomed = []
+        for ns, key, size in self._conn.execute("SELECT namespace, key, size FROM entries ORDER BY atime"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            doomed.append((ns, key))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", doomed)
+        logger.debug(f"Content cache evicted {len(doomed)} entries.")
+
+
+def open_cache(root_path: Path, max_bytes: int = DEFAULT_MAX_BYTES) -> ContentCache:
+    """Persistent cache if the project has a .codigest directory, in-memory otherwise."""
+    artifact_dir = root_path / ".codigest"
+    if artifact_dir.is_dir():
+        return ContentCache(artifact_dir / CACHE_FILENAME, max_bytes=max_bytes)
+    return ContentCache(None, max_bytes=max_bytes)
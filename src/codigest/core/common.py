@@ -4,15 +4,44 @@ Centralizes project discovery, config loading, scanning, and dependency resoluti
 Facade pattern to simplify command implementations.
 """
 import tomllib
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Tuple, List, Optional, Set, Union
 from rich.console import Console
 
 # Core modules
-from . import scanner, resolver
+from . import scanner, resolver, index, shadow, cache, modules, processor, tokenizer, packer, sniff
 
 console = Console()
 
+@dataclass
+class ScanSettings:
+    """[scan] section of config.toml."""
+    backend: str = "auto"       # File discovery backend ("auto" | "walk" | "git")
+    workers: int = 1            # Directory walker threads (1 = serial)
+    read_workers: int = 1       # Snapshot file-reading threads (1 = sequential)
+    process_workers: int = 0    # Processes for numbering/escaping big files (0 = off)
+
+@dataclass
+class ResolveSettings:
+    """[resolve] section of config.toml (dependency resolution, -r)."""
+    import_scanner: str = "tokens"  # "tokens" (no AST) | "ast"
+    jobs: int = 0                   # Import-scanner processes per BFS level (0 = one per CPU)
+    max_depth: Optional[int] = None     # Import hops from the targets (None = unlimited)
+    token_budget: Optional[int] = None  # Estimated tokens for targets + dependencies (None = unlimited)
+
+@dataclass
+class PackSettings:
+    """[pack] section of config.toml (scan --max-tokens)."""
+    max_tokens: Optional[int] = None    # Snapshot token budget (None = no packing)
+    priority: list[str] = field(default_factory=lambda: list(packer.DEFAULT_PRIORITY))
+
+@dataclass
+class OutputSettings:
+    """[output] section of config.toml (sharded snapshots)."""
+    shard_tokens: int = 0   # Shard the snapshot at ~N tokens per file (0 = off)
+    shard_kb: int = 0       # ... and/or at N KB per file (0 = off)
+
 class ProjectContext:
     # [수정] targets 타입을 Union[list[Path], Path]로 확장
     def __init__(self, targets: Optional[Union[list[Path], Path]] = None):
@@ -29,7 +58,27 @@ class ProjectContext:
             
         # 2. 루트 찾기
         self.root_path = self._find_project_root(self.start_path)
+        self.config = self._load_config()
         self.config_extensions, self.config_ignores = self._load_config_filters()
+        self.size_policy = self._load_size_policy()
+        self.scan = self._load_scan_settings()
+        self.resolve = self._load_resolve_settings()
+        self.pack = self._load_pack_settings()
+        self.output = self._load_output_settings()
+        self.anchor_mode = self._load_anchor_mode()
+        # Shared persistent file index (.codigest/index)
+        self.index = index.open_index(self.root_path)
+        # Outcome of the last dependency resolution (frontier, estimated tokens)
+        self.last_resolve: Optional[resolver.ResolveResult] = None
+        # Files the last get_target_files left out under large_file_policy = "skip"
+        self.skipped_files: list[Path] = []
+        # Project-wide module index for -r, built once per context (keyed by the ignores)
+        self._modules: Optional[tuple[tuple[str, ...], modules.ModuleIndex]] = None
+        # Content-keyed cache of derived data (.codigest/cache.db)
+        self.cache = cache.open_cache(self.root_path, max_bytes=self._load_cache_limit())
+        # Token counting backend + per-file counts cached by content hash
+        self.tokenizer = self._load_tokenizer()
+        self.token_counter = tokenizer.FileTokenCounter(self.tokenizer, self.index, self.cache, policy=self.size_policy)
 
     def _find_project_root(self, start_path: Path) -> Path:
         """
@@ -46,32 +95,157 @@ class ProjectContext:
         
         return start_path if start_path.is_dir() else start_path.parent
 
-    def _load_config_filters(self) -> Tuple[Optional[set[str]], list[str]]:
+    def _load_config(self) -> dict:
+        """Reads .codigest/config.toml once (empty dict if missing or broken)."""
         config_path = self.root_path / ".codigest" / "config.toml"
-        extensions = None
-        exclude_patterns = []
-        
-        if config_path.exists():
-            try:
-                with open(config_path, "rb") as f:
-                    data = tomllib.load(f)
-                    filters = data.get("filter", {})
-                    ext_list = filters.get("extensions", [])
-                    if ext_list:
-                        extensions = set(ext_list)
-                    exclude_patterns = filters.get("exclude_patterns", [])
-            except Exception:
-                pass 
+        if not config_path.exists():
+            return {}
+        try:
+            with open(config_path, "rb") as f:
+                return tomllib.load(f)
+        except Exception:
+            return {}
+
+    def _load_config_filters(self) -> Tuple[Optional[set[str]], list[str]]:
+        filters = self.config.get("filter", {})
+        ext_list = filters.get("extensions", [])
+        extensions = set(ext_list) if ext_list else None
+        exclude_patterns = filters.get("exclude_patterns", [])
         return extensions, exclude_patterns
 
+    def _load_size_policy(self) -> processor.SizePolicy:
+        """[filter] max_file_size_kb (0/missing = no limit) and large_file_policy."""
+        filters = self.config.get("filter", {})
+        try:
+            max_kb = float(filters.get("max_file_size_kb", 0))
+        except (TypeError, ValueError):
+            max_kb = 0
+        action = filters.get("large_file_policy", "truncate")
+        if action not in processor.LARGE_FILE_POLICIES:
+            console.print(f"[yellow][Warning] Unknown large_file_policy '{action}', using 'truncate'[/yellow]")
+            action = "truncate"
+        return processor.SizePolicy(max_bytes=int(max(max_kb, 0) * 1024), action=action)
+
+    def _load_scan_settings(self) -> "ScanSettings":
+        settings = self.config.get("scan", {})
+
+        def _int(key: str, default: int, minimum: int) -> int:
+            try:
+                return max(minimum, int(settings.get(key, default)))
+            except (TypeError, ValueError):
+                return default
+
+        backend = settings.get("backend", "auto")
+        if backend not in scanner.BACKENDS:
+            console.print(f"[yellow][Warning] Unknown scan backend '{backend}', using 'auto'[/yellow]")
+            backend = "auto"
+
+        return ScanSettings(
+            backend=backend,
+            workers=_int("workers", 1, 1),
+            read_workers=_int("read_workers", 1, 1),
+            process_workers=_int("process_workers", 0, 0),
+        )
+
+    def _load_resolve_settings(self) -> "ResolveSettings":
+        settings = self.config.get("resolve", {})
+
+        import_scanner = settings.get("import_scanner", "tokens")
+        if import_scanner not in resolver.IMPORT_SCANNERS:
+            console.print(f"[yellow][Warning] Unknown import scanner '{import_scanner}', using 'tokens'[/yellow]")
+            import_scanner = "tokens"
+
+        def _int(key: str, default: int) -> int:
+            try:
+                return int(settings.get(key, default))
+            except (TypeError, ValueError):
+                return default
+
+        # Config uses -1 (depth) / 0 (budget) for "unlimited"
+        max_depth = _int("max_depth", -1)
+        token_budget = _int("token_budget", 0)
+
+        return ResolveSettings(
+            import_scanner=import_scanner,
+            jobs=max(0, _int("jobs", 0)),
+            max_depth=max_depth if max_depth >= 0 else None,
+            token_budget=token_budget if token_budget > 0 else None,
+        )
+
+    def _load_pack_settings(self) -> "PackSettings":
+        settings = self.config.get("pack", {})
+        try:
+            max_tokens = int(settings.get("max_tokens", 0))
+        except (TypeError, ValueError):
+            max_tokens = 0
+
+        priority = settings.get("priority", packer.DEFAULT_PRIORITY)
+        if not isinstance(priority, list):
+            priority = packer.DEFAULT_PRIORITY
+        unknown = [key for key in priority if key not in packer.PRIORITY_KEYS]
+        if unknown:
+            console.print(f"[yellow][Warning] Unknown pack priority keys {unknown}, ignoring them[/yellow]")
+
+        return PackSettings(
+            max_tokens=max_tokens if max_tokens > 0 else None,
+            priority=[key for key in priority if key in packer.PRIORITY_KEYS] or list(packer.DEFAULT_PRIORITY),
+        )
+
+    def _load_output_settings(self) -> "OutputSettings":
+        settings = self.config.get("output", {})
+
+        def _int(key: str) -> int:
+            try:
+                return max(0, int(settings.get(key, 0)))
+            except (TypeError, ValueError):
+                return 0
+
+        return OutputSettings(shard_tokens=_int("shard_tokens"), shard_kb=_int("shard_kb"))
+
+    def _load_anchor_mode(self) -> str:
+        """[anchor] mode: "objects" (no worktree copy) or "worktree" (mirrored files)."""
+        mode = self.config.get("anchor", {}).get("mode", "objects")
+        if mode not in shadow.ANCHOR_MODES:
+            console.print(f"[yellow][Warning] Unknown anchor mode '{mode}', using 'objects'[/yellow]")
+            mode = "objects"
+        return mode
+
+    def _load_cache_limit(self) -> int:
+        """[cache] max_size_mb: size bound of .codigest/cache.db (LRU eviction)."""
+        try:
+            size_mb = float(self.config.get("cache", {}).get("max_size_mb", 64))
+        except (TypeError, ValueError):
+            size_mb = 64
+        return int(max(size_mb, 1) * 1024 * 1024)
+
+    def _load_tokenizer(self):
+        """[tokenizer] backend ("estimate" | "heuristic" | "tiktoken"), encoding and vocab_dir."""
+        settings = self.config.get("tokenizer", {})
+        backend = settings.get("backend", tokenizer.DEFAULT_BACKEND)
+        if backend not in tokenizer.BACKENDS:
+            console.print(f"[yellow][Warning] Unknown tokenizer backend '{backend}', using '{tokenizer.DEFAULT_BACKEND}'[/yellow]")
+            backend = tokenizer.DEFAULT_BACKEND
+        vocab_dir = settings.get("vocab_dir")
+        return tokenizer.get_backend(
+            backend,
+            encoding=settings.get("encoding", tokenizer.DEFAULT_ENCODING),
+            vocab_dir=(self.root_path / vocab_dir) if vocab_dir else None
+        )
+
+    def get_anchor(self) -> shadow.ContextAnchor:
+        return shadow.ContextAnchor(self.root_path, mode=self.anchor_mode, index=self.index)
+
     def get_target_files(
         self, 
         targets: Optional[Union[list[Path], Path]] = None, 
         ignore_config: bool = False,
-        resolve_deps: bool = False
+        resolve_deps: bool = False,
+        max_depth: Optional[int] = None,
+        token_budget: Optional[int] = None
     ) -> list[Path]:
         """
         The Master Method:
+        max_depth/token_budget override the [resolve] limits for this call.
         """
         # [핵심 수정] 입력된 경로를 무조건 '절대 경로'로 변환 (Resolve)
         # 이걸 안 하면 'src' 같은 상대 경로 입력 시 root_path(절대 경로)와 비교 실패함
@@ -104,15 +278,78 @@ class ProjectContext:
             self.root_path, 
             extensions=exts, 
             extra_ignores=ignores, 
-            include_paths=scan_scope
+            include_paths=scan_scope,
+            workers=self.scan.workers,
+            index=self.index,
+            backend=self.scan.backend
         )
+        self.index.save()
 
         # 4. Resolve Dependencies
         if resolve_deps:
-            files = resolver.resolve_dependencies(self.root_path, files)
+            # An unscoped scan that admits Python files and project markers already
+            # lists every module; otherwise the module index needs its own scan
+            covers_modules = scan_scope is None and (exts is None or modules.MODULE_EXTENSIONS <= exts)
+            self.last_resolve = resolver.resolve_limited(
+                self.root_path, files,
+                max_depth=max_depth if max_depth is not None else self.resolve.max_depth,
+                token_budget=token_budget if token_budget is not None else self.resolve.token_budget,
+                index=self.index,
+                cache=self.cache,
+                import_scanner=self.resolve.import_scanner,
+                jobs=self.resolve.jobs,
+                modules=self._module_index(ignores, files if covers_modules else None),
+                token_counter=self.token_counter
+            )
+            files = self.last_resolve.files
+            self.index.save()
+            self.cache.save()
 
+        # 5. Large-file policy: skipped files are out for every command (scan, diff, semdiff, ...)
+        files = self._apply_size_policy(files)
         return files
 
+    def _apply_size_policy(self, files: list[Path]) -> list[Path]:
+        """Drops text files above the size limit if the policy is "skip" (binaries stay as placeholders)."""
+        self.skipped_files = []
+        policy = self.size_policy
+        if not policy.max_bytes or policy.action != "skip":
+            return files
+        kept = []
+        for f in files:
+            try:
+                skip = policy.action_for(self.index.stat(f).size) == "skip"
+            except OSError:
+                skip = False
+            if skip and self.index.content_kind(f) == sniff.TEXT:
+                self.skipped_files.append(f)
+            else:
+                kept.append(f)
+        if self.skipped_files:
+            self.index.save()
+        return kept
+
+    def _module_index(self, ignores: list[str], project_files: Optional[list[Path]] = None) -> modules.ModuleIndex:
+        """
+        Module locations over the whole project (Python files + project markers).
+        project_files: a project-wide scan result to build from (skips the extra scan).
+        """
+        key = tuple(ignores)
+        if self._modules is not None and self._modules[0] == key:
+            return self._modules[1]
+        if project_files is None:
+            project_files = scanner.scan_project(
+                self.root_path,
+                extensions=modules.MODULE_EXTENSIONS,
+                extra_ignores=ignores,
+                workers=self.scan.workers,
+                index=self.index,
+                backend=self.scan.backend
+            )
+        module_index = modules.ModuleIndex(self.root_path, project_files)
+        self._modules = (key, module_index)
+        return module_index
+
 # Helper for quick access
 def get_context(targets: Optional[Union[list[Path], Path]] = None) -> ProjectContext:
     return ProjectContext(targets)
\ No newline at end of file
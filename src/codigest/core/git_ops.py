@@ -2,6 +2,7 @@
 Git Operations.
 Retains the 'Untracked File' detection logic from the prototype.
 """
+import os
 import subprocess
 from pathlib import Path
 from loguru import logger
@@ -9,6 +10,67 @@ from loguru import logger
 def is_git_repo(root_path: Path) -> bool:
     return (root_path / ".git").exists()
 
+def list_files(root_path: Path) -> list[str] | None:
+    """
+    Tracked + untracked (not ignored) files as posix paths relative to root_path,
+    straight from git's index. Returns None if git is unavailable or fails.
+    Submodule entries are dropped; symlinks are kept only if they point to a file.
+    Untracked nested repositories are listed by git as one "dir/" entry; they are
+    returned with the trailing "/" so the caller can walk them.
+    """
+    queries = {
+        "staged": ["--stage"],
+        "others": ["--others", "--exclude-standard"],
+        # Tracked files removed from the working tree are still in the index
+        "deleted": ["--deleted"],
+    }
+    try:
+        # The three listings are independent; run them concurrently
+        procs = {
+            key: subprocess.Popen(
+                ["git", "ls-files", "-z", *args],
+                cwd=root_path,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL
+            )
+            for key, args in queries.items()
+        }
+        listings = {}
+        for key, proc in procs.items():
+            output, _ = proc.communicate()
+            if proc.returncode != 0:
+                raise subprocess.CalledProcessError(proc.returncode, proc.args)
+            listings[key] = [os.fsdecode(p) for p in output.split(b"\0") if p]
+    except (subprocess.CalledProcessError, OSError) as e:
+        logger.debug(f"git ls-files failed: {e}")
+        return None
+
+    staged, others = listings["staged"], listings["others"]
+    deleted = set(listings["deleted"])
+
+    files = []
+    seen = set()
+    for line in staged:
+        # "<mode> <object> <stage>\t<path>" (one line per stage during merges)
+        info, _, path = line.partition("\t")
+        mode = info.split(" ", 1)[0]
+        if path in seen or path in deleted or mode == "160000":
+            continue
+        if mode == "120000" and not (root_path / path).is_file():
+            continue
+        seen.add(path)
+        files.append(path)
+
+    for path in others:
+        if path.endswith("/"):
+            # Nested repository (git does not look inside it)
+            if (root_path / path).is_dir():
+                files.append(path)
+        elif (root_path / path).is_file():
+            # Same rule as tracked symlinks: links to directories are dropped
+            files.append(path)
+    return files
+
 def get_smart_diff(root_path: Path) -> str:
     """
     Fetches git diff AND content of untracked (new) files.
@@ -0,0 +1,148 @@
+"""
+Compiled Ignore Engine.
+- Patterns are compiled into combined regexes (one per run of same-sign patterns),
+  so a lookup is a single regex match instead of one match per pattern.
+- Nested .gitignore files are loaded lazily as the walk descends,
+  .git/info/exclude is honored at the root.
+- Directory verdicts are cached: once a directory is ignored, its whole subtree is.
+"""
+import re
+import threading
+from pathlib import Path
+from typing import Optional
+from loguru import logger
+from pathspec.patterns import GitWildMatchPattern
+
+# pathspec names the directory-suffix group; names must be unique in an alternation
+_NAMED_GROUP = re.compile(r"\(\?P<[^>]+>")
+
+
+def read_ignore_file(path: Path) -> list[str]:
+    """Reads a gitignore-style file (blank lines and comments dropped)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return [
+                line.strip() for line in f
+                if line.strip() and not line.startswith("#")
+            ]
+    except FileNotFoundError:
+        return []
+    except Exception as e:
+        logger.warning(f"Failed to read {path}: {e}")
+        return []
+
+
+class CompiledPatterns:
+    """
+    A gitignore pattern list compiled for last-match-wins evaluation.
+    Consecutive patterns with the same sign share one regex; groups are tried
+    from last to first and the first hit decides.
+    """
+    def __init__(self, lines: list[str]):
+        self.groups: list[tuple[re.Pattern, bool]] = []
+
+        run_sources: list[str] = []
+        run_include: Optional[bool] = None
+        for line in lines:
+            pattern = GitWildMatchPattern(line)
+            if pattern.include is None:
+                continue
+            if pattern.include is not run_include and run_sources:
+                self._add_group(run_sources, run_include)
+                run_sources = []
+            run_include = pattern.include
+            run_sources.append(_NAMED_GROUP.sub("(?:", pattern.regex.pattern))
+        if run_sources:
+            self._add_group(run_sources, run_include)
+        self.groups.reverse()
+
+    def _add_group(self, sources: list[str], include: bool):
+        combined = "|".join(f"(?:{src})" for src in sources)
+        self.groups.append((re.compile(combined), include))
+
+    def __bool__(self) -> bool:
+        return bool(self.groups)
+
+    def decide(self, rel_path: str) -> Optional[bool]:
+        """True = ignored, False = re-included by a negation, None = no pattern matched."""
+        for regex, include in self.groups:
+            if regex.match(rel_path):
+                return include
+        return None
+
+
+# Chain of (directory prefix, patterns), deepest last
+_Chain = tuple[tuple[str, CompiledPatterns], ...]
+
+
+class IgnoreEngine:
+    def __init__(self, root_path: Path, base_patterns: list[str], vcs_files: bool = True):
+        """
+        base_patterns: root-level rules (defaults + config), evaluated before
+        .git/info/exclude and the root .gitignore so those can override them.
+        vcs_files=False skips every git ignore file (git already applied them).
+        """
+        self.root_path = root_path
+        self.vcs_files = vcs_files
+        self._lock = threading.Lock()
+
+        root_lines = list(base_patterns)
+        if vcs_files:
+            root_lines.extend(read_ignore_file(root_path / ".git" / "info" / "exclude"))
+            root_lines.extend(read_ignore_file(root_path / ".gitignore"))
+        root = CompiledPatterns(root_lines)
+
+        self._chains: dict[str, _Chain] = {"": (("", root),) if root else ()}
+        self._dir_verdicts: dict[str, bool] = {}
+
+    def _chain_for(self, dir_prefix: str) -> _Chain:
+        """Pattern chain for a directory prefix ("" for root, "a/b/" otherwise)."""
+        chain = self._chains.get(dir_prefix)
+        if chain is not None:
+            return chain
+
+        parent = dir_prefix[:dir_prefix.rstrip("/").rfind("/") + 1]
+        chain = self._chain_for(parent)
+        if self.vcs_files:
+            lines = read_ignore_file(self.root_path / dir_prefix / ".gitignore")
+            if lines:
+                chain = chain + ((dir_prefix, CompiledPatterns(lines)),)
+        with self._lock:
+            self._chains[dir_prefix] = chain
+        return chain
+
+    def _match(self, rel_path: str) -> bool:
+        slash = rel_path.rfind("/", 0, len(rel_path) - 1)
+        chain = self._chain_for(rel_path[:slash + 1])
+        # Deeper .gitignore files take precedence over their parents
+        for prefix, patterns in reversed(chain):
+            verdict = patterns.decide(rel_path[len(prefix):])
+            if verdict is not None:
+                return verdict
+        return False
+
+    def is_ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        """
+        rel_path: posix path relative to the root ('/'-suffixed for directories).
+        Only the entry itself is checked; use is_path_ignored for flat path lists.
+        """
+        if not is_dir:
+            return self._match(rel_path)
+
+        verdict = self._dir_verdicts.get(rel_path)
+        if verdict is None:
+            verdict = self._match(rel_path)
+            self._dir_verdicts[rel_path] = verdict
+        return verdict
+
+    def is_path_ignored(self, rel_path: str) -> bool:
+        """
+        Checks a file path including every parent directory
+        (for path lists that did not come from a pruning walk).
+        """
+        end = rel_path.find("/")
+        while end != -1:
+            if self.is_ignored(rel_path[:end + 1], is_dir=True):
+                return True
+            end = rel_path.find("/", end + 1)
+        return self.is_ignored(rel_path)
@@ -0,0 +1,308 @@
+"""
+Persistent Scan Index (.codigest/index).
+SQLite store shared by all commands:
+  - dirs:  raw directory listings keyed by directory mtime
+           (unchanged directories are never re-listed)
+  - files: path, size, mtime, inode, content hash and content kind per scanned file
+           (hash and kind are only recomputed when size/mtime/inode change)
+Content hashes are git blob ids, so they compare directly with the anchor.
+Nothing is loaded up front: single rows are looked up by key on first use,
+and a scan loads the rows of its scope in one range query. Rows under a
+scanned scope that the scan no longer found are pruned on save.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional
+from loguru import logger
+
+from . import sniff
+from .walker import DirListing, list_directory
+
+INDEX_FILENAME = "index"
+SCHEMA_VERSION = 2
+
+# Entries modified this recently may still change within the same mtime tick
+# (the "racy git" problem), so they are never trusted from the cache.
+RACY_WINDOW_NS = 2_000_000_000
+
+# Lookup result for keys known to have no row
+_MISSING = object()
+
+_TYPE_CODES = {(True, False): b"d", (False, True): b"f", (False, False): b"o"}
+
+@dataclass
+class FileRecord:
+    size: int
+    mtime_ns: int
+    inode: int
+    content_hash: Optional[str] = None
+    kind: Optional[str] = None  # sniff label ("text", "PNG image", ...)
+
+    def same_stat(self, st: os.stat_result) -> bool:
+        return (self.size, self.mtime_ns, self.inode) == (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+def git_blob_hash(data: bytes) -> str:
+    """Same id `git hash-object` would produce."""
+    h = hashlib.sha1(b"blob %d\0" % len(data))
+    h.update(data)
+    return h.hexdigest()
+
+
+def _encode_listing(listing: DirListing) -> bytes:
+    return b"\0".join(_TYPE_CODES[(d, f)] + os.fsencode(name) for name, d, f in listing)
+
+
+def _decode_listing(blob: bytes) -> DirListing:
+    if not blob:
+        return []
+    listing = []
+    for item in blob.split(b"\0"):
+        code = item[:1]
+        listing.append((os.fsdecode(item[1:]), code == b"d", code == b"f"))
+    return listing
+
+
+class ScanIndex:
+    def __init__(self, db_path: Optional[Path] = None):
+        """db_path=None keeps the index in memory only (no .codigest directory)."""
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # Rows looked up (or written) this run; _MISSING marks keys without a row
+        self._dirs: dict[str, object] = {}
+        self._files: dict[str, object] = {}
+        self._dirty_dirs: set[str] = set()
+        self._dirty_files: set[str] = set()
+        # Pruning: keys the scans found, and the scopes they covered completely
+        self._seen_dirs: set[str] = set()
+        self._seen_files: set[str] = set()
+        self._prune_scopes: list[tuple[str, bool]] = []
+        self._conn = self._connect()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self.db_path is None:
+            return None
+        try:
+            # Walker threads share the connection; every use holds self._lock
+            conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                conn.executescript(f"""
+                    DROP TABLE IF EXISTS dirs;
+                    DROP TABLE IF EXISTS files;
+                    CREATE TABLE dirs (path TEXT PRIMARY KEY, mtime_ns INTEGER, entries BLOB);
+                    CREATE TABLE files (
+                        path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,
+                        inode INTEGER, hash TEXT, kind TEXT
+                    );
+                    PRAGMA user_version = {SCHEMA_VERSION};
+                """)
+            return conn
+        except sqlite3.Error as e:
+            logger.warning(f"Scan index unavailable ({e}), continuing without it.")
+            return None
+
+    def _query(self, sql: str, key: str) -> Optional[tuple]:
+        """One row by primary key (caller holds the lock)."""
+        if self._conn is None:
+            return None
+        try:
+            return self._conn.execute(sql, (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.debug(f"Scan index lookup failed: {e}")
+            return None
+
+    def _dir_row(self, key: str) -> Optional[tuple[int, bytes]]:
+        with self._lock:
+            self._seen_dirs.add(key)
+            row = self._dirs.get(key)
+            if row is None:
+                row = self._query("SELECT mtime_ns, entries FROM dirs WHERE path = ?", key) or _MISSING
+                self._dirs[key] = row
+        return None if row is _MISSING else row
+
+    def _file_row(self, key: str) -> Optional[FileRecord]:
+        with self._lock:
+            self._seen_files.add(key)
+            record = self._files.get(key)
+            if record is None:
+                row = self._query("SELECT size, mtime_ns, inode, hash, kind FROM files WHERE path = ?", key)
+                record = FileRecord(*row) if row else _MISSING
+                self._files[key] = record
+        return None if record is _MISSING else record
+
+    def load_scope(self, scopes: list[Path], dirs: bool = True):
+        """
+        Loads every row under the given directories in one range query per scope
+        (a scan is about to look most of them up). Rows already looked up are kept.
+        """
+        if self._conn is None:
+            return
+        tables = [("files", "size, mtime_ns, inode, hash, kind", self._files, lambda row: FileRecord(*row))]
+        if dirs:
+            tables.append(("dirs", "mtime_ns, entries", self._dirs, tuple))
+        with self._lock:
+            for scope in scopes:
+                prefix = _scope_prefix(str(scope))
+                # Keys starting with prefix sort between prefix and prefix with its last char bumped
+                bounds = (str(scope), prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+                for table, columns, rows, make in tables:
+                    try:
+                        cursor = self._conn.execute(
+                            f"SELECT path, {columns} FROM {table} WHERE path = ? OR (path >= ? AND path < ?)",
+                            bounds
+                        )
+                        for path, *row in cursor:
+                            rows.setdefault(path, make(row))
+                    except sqlite3.Error as e:
+                        logger.debug(f"Scan index load failed: {e}")
+
+    # --- Directory listings -------------------------------------------------
+
+    def list_dir(self, directory: Path) -> DirListing:
+        """Cached listing if the directory mtime is unchanged, otherwise a fresh scandir."""
+        key = str(directory)
+        mtime_ns = os.stat(directory).st_mtime_ns
+
+        cached = self._dir_row(key)
+        if cached and cached[0] == mtime_ns:
+            return _decode_listing(cached[1])
+
+        listing = list_directory(directory)
+        if time.time_ns() - mtime_ns > RACY_WINDOW_NS:
+            with self._lock:
+                self._dirs[key] = (mtime_ns, _encode_listing(listing))
+                self._dirty_dirs.add(key)
+        return listing
+
+    # --- File records -------------------------------------------------------
+
+    def stat(self, path: Path) -> FileRecord:
+        """Fresh stat, merged with the stored record (keeps the hash if the file is unchanged)."""
+        key = str(path)
+        st = os.stat(path)
+        record = self._file_row(key)
+        if record is not None and record.same_stat(st):
+            return record
+
+        record = FileRecord(st.st_size, st.st_mtime_ns, st.st_ino)
+        with self._lock:
+            self._files[key] = record
+            self._dirty_files.add(key)
+        return record
+
+    def content_hash(self, path: Path, data: Optional[bytes] = None) -> str:
+        """
+        Git blob id of the file content.
+        Pass `data` if the caller already read the file to avoid a second read.
+        """
+        record = self.stat(path)
+        if record.content_hash:
+            return record.content_hash
+
+        if data is None:
+            data = path.read_bytes()
+        content_hash = git_blob_hash(data)
+        # Racy entries are hashed but not persisted (a same-tick edit would go unnoticed)
+        if time.time_ns() - record.mtime_ns > RACY_WINDOW_NS:
+            with self._lock:
+                record.content_hash = content_hash
+                self._dirty_files.add(str(path))
+        return content_hash
+
+    def content_kind(self, path: Path) -> str:
+        """Text/binary verdict from the first few KB of the file (cached like the hash)."""
+        record = self.stat(path)
+        if record.kind:
+            return record.kind
+
+        try:
+            kind = sniff.classify_file(path)
+        except OSError as e:
+            # Left to the reader, which reports the error in the snapshot
+            logger.debug(f"Cannot sniff {path}: {e}")
+            return sniff.TEXT
+        if time.time_ns() - record.mtime_ns > RACY_WINDOW_NS:
+            with self._lock:
+                record.kind = kind
+                self._dirty_files.add(str(path))
+        return kind
+
+    # --- Persistence --------------------------------------------------------
+
+    def mark_scanned(self, scopes: list[Path], files: Iterable[Path], dirs: bool = True):
+        """
+        Records a complete discovery of `scopes`: on save, file rows under them
+        that are not among `files` (deleted, now ignored or filtered out) are
+        dropped, and so are dir rows not listed this run (only if `dirs`, i.e.
+        the scan walked the directories).
+        """
+        with self._lock:
+            self._seen_files.update(str(f) for f in files)
+            self._prune_scopes.extend((str(scope), dirs) for scope in scopes)
+
+    def save(self):
+        """Writes dirty rows back and prunes scanned scopes, in a single transaction."""
+        if self._conn is None or not (self._dirty_dirs or self._dirty_files or self._prune_scopes):
+            return
+        with self._lock:
+            dirs = [(k, *self._dirs[k]) for k in self._dirty_dirs]
+            files = [
+                (k, r.size, r.mtime_ns, r.inode, r.content_hash, r.kind)
+                for k in self._dirty_files
+                if isinstance(r := self._files.get(k), FileRecord)
+            ]
+            scopes = self._prune_scopes
+            self._dirty_dirs.clear()
+            self._dirty_files.clear()
+            self._prune_scopes = []
+            try:
+                with self._conn:
+                    self._conn.executemany("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)", dirs)
+                    self._conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)", files)
+                    if scopes:
+                        self._prune(scopes)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to save scan index: {e}")
+
+    def _prune(self, scopes: list[tuple[str, bool]]):
+        """
+        Deletes the loaded rows under the scopes that were not seen this run
+        (caller holds the lock). Scopes are complete after load_scope.
+        """
+        for table, rows, seen, with_dirs in (
+            ("files", self._files, self._seen_files, False),
+            ("dirs", self._dirs, self._seen_dirs, True),
+        ):
+            prefixes = {scope for scope, walked in scopes if walked or not with_dirs}
+            if not prefixes:
+                continue
+            bounds = tuple(_scope_prefix(scope) for scope in prefixes)
+            stale = [
+                key for key, row in rows.items()
+                if row is not _MISSING and key not in seen
+                and (key in prefixes or key.startswith(bounds))
+            ]
+            if not stale:
+                continue
+            self._conn.executemany(f"DELETE FROM {table} WHERE path = ?", ((key,) for key in stale))
+            for key in stale:
+                rows[key] = _MISSING
+            logger.debug(f"Scan index: pruned {len(stale)} {table} rows")
+
+
+def _scope_prefix(scope: str) -> str:
+    return scope.rstrip(os.sep) + os.sep
+
+
+def open_index(root_path: Path) -> ScanIndex:
+    """Persistent index if the project has a .codigest directory, in-memory otherwise."""
+    artifact_dir = root_path / ".codigest"
+    if artifact_dir.is_dir():
+        return ScanIndex(artifact_dir / INDEX_FILENAME)
+    return ScanIndex(None)
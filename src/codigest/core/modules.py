@@ -0,0 +1,97 @@
+"""
+Module Location Index.
+Built once from the scanned file list, so import resolution is a set/dict
+lookup with zero stat calls.
+Source roots (in priority order):
+  - the project root and root/src
+  - package dirs declared in pyproject.toml (setuptools, hatch, poetry)
+  - nested projects (directories with their own pyproject.toml / setup.py / setup.cfg)
+    and their src/ directories, for monorepo layouts
+Namespace packages need no __init__.py: a module is located by its path alone.
+"""
+import tomllib
+from pathlib import Path
+from typing import Iterable, Optional
+from loguru import logger
+
+PROJECT_MARKERS = {"pyproject.toml", "setup.py", "setup.cfg"}
+# Extension filter that admits every module and marker (the scanner always keeps pyproject.toml)
+MODULE_EXTENSIONS = {".py", ".cfg"}
+
+
+def _declared_roots(project_dir: Path) -> list[Path]:
+    """Source directories declared in a project's pyproject.toml."""
+    try:
+        with open(project_dir / "pyproject.toml", "rb") as f:
+            data = tomllib.load(f)
+    except FileNotFoundError:
+        return []
+    except Exception as e:
+        logger.debug(f"Unreadable pyproject.toml in {project_dir}: {e}")
+        return []
+
+    tool = data.get("tool", {})
+    roots: list[str] = []
+
+    setuptools = tool.get("setuptools", {})
+    package_dir = setuptools.get("package-dir", {})
+    if isinstance(package_dir, dict) and isinstance(package_dir.get(""), str):
+        roots.append(package_dir[""])
+    packages = setuptools.get("packages", {})
+    if isinstance(packages, dict):
+        where = packages.get("find", {}).get("where", [])
+        roots.extend(w for w in where if isinstance(w, str))
+
+    # hatch: packages = ["src/foo"] -> the parent directory is the root
+    wheel = tool.get("hatch", {}).get("build", {}).get("targets", {}).get("wheel", {})
+    for package in wheel.get("packages", []):
+        if isinstance(package, str):
+            roots.append(str(Path(package).parent))
+
+    # poetry: packages = [{include = "foo", from = "lib"}]
+    for package in tool.get("poetry", {}).get("packages", []):
+        if isinstance(package, dict):
+            roots.append(package.get("from", "."))
+
+    return [(project_dir / root).resolve() for root in roots]
+
+
+class ModuleIndex:
+    def __init__(self, root_path: Path, files: Iterable[Path]):
+        files = list(files)
+        self.root_path = root_path
+        self.files: set[Path] = {f for f in files if f.suffix == ".py"}
+
+        project_dirs = sorted(
+            {f.parent for f in files if f.name in PROJECT_MARKERS and f.parent != root_path},
+            key=lambda d: (len(d.parts), d)
+        )
+        roots = [root_path, root_path / "src"]
+        roots += _declared_roots(root_path)
+        for project_dir in project_dirs:
+            roots += [project_dir, project_dir / "src"]
+            roots += _declared_roots(project_dir)
+        self.roots: list[Path] = list(dict.fromkeys(roots))
+
+    def find(self, base: Path, parts: list[str]) -> Optional[Path]:
+        """Module `parts` under directory `base`: module file first, then package."""
+        target = base.joinpath(*parts)
+        p_py = target.with_name(target.name + ".py")
+        if p_py in self.files:
+            return p_py
+        p_init = target / "__init__.py"
+        if p_init in self.files:
+            return p_init
+        return None
+
+    def locate(self, module_name: str, current_file: Path) -> Optional[Path]:
+        """Absolute import: sibling of the importing file first, then each source root."""
+        parts = module_name.split(".")
+        found = self.find(current_file.parent, parts)
+        if found is not None:
+            return found
+        for root in self.roots:
+            found = self.find(root, parts)
+            if found is not None:
+                return found
+        return None
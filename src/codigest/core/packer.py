@@ -0,0 +1,198 @@
+"""
+Token-Budget Packing (scan --max-tokens).
+Chooses what goes into a snapshot so the whole output fits a token budget:
+  1. Candidates are ranked by the configured priority keys
+       target   - files inside the explicit scan targets first
+       distance - fewest import hops from the targets (-r) first
+       recent   - changed since the anchor first, then newest mtime
+       size     - smallest first
+  2. Greedy walk in rank order: a file goes in full if its block fits,
+     otherwise as its symbol digest (status " (DIGEST)"), otherwise it is omitted.
+Blocks are charged exactly as the snapshot writer counts them (template parts,
+tree lines and every block with its separator), so the result never exceeds
+the budget. Cached per-file counts let files that cannot fit skip the read.
+What went in full, as a digest or not at all is recorded next to the snapshot
+(snapshot.pack.json); the anchor always records every candidate.
+"""
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+
+from . import prompts, semdiff, snapshot, tags
+from .cache import ContentCache
+from .index import ScanIndex
+
+PRIORITY_KEYS = ("target", "distance", "recent", "size")
+DEFAULT_PRIORITY = list(PRIORITY_KEYS)
+
+DIGEST_STATUS = " (DIGEST)"
+BLOCK_SEPARATOR = "\n\n"
+
+
+@dataclass
+class PackSignals:
+    """Per-file ranking inputs (missing entries rank as neutral)."""
+    targets: list[Path] = field(default_factory=list)   # Explicit scope ([] = everything)
+    depths: dict[Path, int] = field(default_factory=dict)
+    changed: set[Path] = field(default_factory=set)
+    mtimes: dict[Path, int] = field(default_factory=dict)
+    sizes: dict[Path, int] = field(default_factory=dict)
+
+    def is_target(self, file_path: Path) -> bool:
+        if not self.targets:
+            return True
+        return any(file_path == t or file_path.is_relative_to(t) for t in self.targets)
+
+
+def rank_files(files: Iterable[Path], priority: list[str], signals: PackSignals) -> list[Path]:
+    """Files in packing order (path as the final tie-breaker)."""
+    def _key(file_path: Path) -> tuple:
+        key = []
+        for name in priority:
+            if name == "target":
+                key.append(0 if signals.is_target(file_path) else 1)
+            elif name == "distance":
+                key.append(signals.depths.get(file_path, 0))
+            elif name == "recent":
+                key.append(0 if file_path in signals.changed else 1)
+                key.append(-signals.mtimes.get(file_path, 0))
+            elif name == "size":
+                key.append(signals.sizes.get(file_path, 0))
+        key.append(str(file_path))
+        return tuple(key)
+
+    return sorted(files, key=_key)
+
+
+@dataclass
+class PackResult:
+    blocks: dict[Path, str] = field(default_factory=dict)  # Chosen block per packed file
+    full: list[Path] = field(default_factory=list)
+    digested: list[Path] = field(default_factory=list)
+    omitted: list[Path] = field(default_factory=list)
+    tokens: int = 0                                         # Whole snapshot, as the writer counts it
+    budget: int = 0
+
+
+def manifest_path(output_path: Path) -> Path:
+    """snapshot.xml -> snapshot.pack.json"""
+    return output_path.with_name(f"{output_path.stem}.pack.json")
+
+
+def write_manifest(output_path: Path, result: PackResult, root_path: Path) -> Path:
+    """Records how each candidate was packed (paths as shown in the snapshot)."""
+    path = manifest_path(output_path)
+    manifest = {
+        "snapshot": output_path.name,
+        "budget": result.budget,
+        "tokens": result.tokens,
+        "full": [snapshot.display_path(f, root_path) for f in result.full],
+        "digested": [snapshot.display_path(f, root_path) for f in result.digested],
+        "omitted": [snapshot.display_path(f, root_path) for f in result.omitted],
+    }
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, path)
+    return path
+
+
+class SnapshotPacker:
+    def __init__(
+            self,
+            root_path: Path,
+            loader: snapshot.BlockLoader,
+            token_backend,
+            template: prompts.StreamTemplate,
+            index: ScanIndex,
+            cache: Optional[ContentCache] = None,
+            jobs: int = 0
+            ):
+        self.root_path = root_path
+        self.loader = loader
+        self.backend = token_backend
+        self.template = template
+        self.index = index
+        self.cache = cache
+        self.jobs = jobs
+
+    def _count_chunk(self, chunk: str) -> int:
+        return self.backend.count(self.template.transform(chunk))
+
+    def _base_tokens(self, tree_lines: list[str]) -> int:
+        """Everything but the file blocks: template text and the (full) tree."""
+        tokens = sum(self.backend.count(part) for part in self.template.parts)
+        tokens += sum(self._count_chunk(line) for line in snapshot.joined(tree_lines, "\n"))
+        return tokens
+
+    def _block_cost(self, block: str) -> int:
+        # Every block is charged with its separator (the first one is 1-2 tokens over)
+        return self._count_chunk(BLOCK_SEPARATOR + block)
+
+    def pack(
+        self,
+        ranked: list[Path],
+        budget: int,
+        tree_lines: list[str],
+        lower_bounds: Optional[dict[Path, int]] = None
+    ) -> PackResult:
+        """
+        ranked: candidates in priority order.
+        lower_bounds: cheap per-file token estimates (cached raw counts);
+                      files whose estimate already exceeds the room left are not read.
+        """
+        lower_bounds = lower_bounds or {}
+        result = PackResult(budget=budget)
+        result.tokens = self._base_tokens(tree_lines)
+        digests: Optional[dict[Path, str]] = None
+        # Smallest possible block: nothing cheaper can still fit once the room is below it
+        min_cost = self._block_cost(tags.file("", ""))
+
+        for i, file_path in enumerate(ranked):
+            room = budget - result.tokens
+            if room < min_cost:
+                result.omitted.extend(ranked[i:])
+                break
+
+            if lower_bounds.get(file_path, 0) + min_cost <= room:
+                block = self.loader.load(file_path)
+                if block is not None:
+                    cost = self._block_cost(block)
+                    if cost <= room:
+                        result.blocks[file_path] = block
+                        result.full.append(file_path)
+                        result.tokens += cost
+                        continue
+
+            if digests is None:
+                # First downgrade: symbol digests of all remaining candidates in one batch
+                digests = self._load_digests(ranked[i:])
+            summary = digests.get(file_path, "")
+            if summary:
+                block = tags.file(snapshot.display_path(file_path, self.root_path), summary, status=DIGEST_STATUS)
+                cost = self._block_cost(block)
+                if cost <= room:
+                    result.blocks[file_path] = block
+                    result.digested.append(file_path)
+                    result.tokens += cost
+                    continue
+            result.omitted.append(file_path)
+
+        return result
+
+    def _load_digests(self, files: list[Path]) -> dict[Path, str]:
+        """semdiff.summarize_symbols of each Python file (symbol tables cached by content hash)."""
+        py_files = []
+        requests = []
+        for file_path in files:
+            if file_path.suffix not in (".py", ".pyi"):
+                continue
+            try:
+                requests.append(semdiff.symbol_request(self.index, file_path))
+            except OSError:
+                continue
+            py_files.append(file_path)
+
+        tables = semdiff.load_symbols_many(requests, self.cache, jobs=self.jobs)
+        return {f: semdiff.summarize_symbols(symbols) for f, symbols in zip(py_files, tables)}
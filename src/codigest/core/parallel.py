@@ -0,0 +1,55 @@
+"""
+Parallel Analysis Engine.
+Fans CPU-bound per-file work (AST parsing) out over a process pool.
+  - Work is submitted in chunks so pickling and IPC are amortized.
+  - Results come back in input order, so output stays deterministic.
+  - Small batches run inline: spawning workers costs more than it saves.
+Task functions must be top-level (picklable) and should return compact,
+plain-data results (tuples/lists) rather than rich objects.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Optional, TypeVar
+
+from loguru import logger
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Below this many items a pool is not worth starting
+MIN_PARALLEL_ITEMS = 32
+
+
+def resolve_jobs(jobs: int) -> int:
+    """jobs <= 0 means one worker per CPU."""
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def map_ordered(
+    fn: Callable[[T], R],
+    items: Iterable[T],
+    jobs: int = 0,
+    chunk_size: Optional[int] = None,
+    min_items: int = MIN_PARALLEL_ITEMS
+) -> list[R]:
+    """
+    [fn(item) for item in items], computed on up to `jobs` processes.
+    chunk_size defaults to ~4 chunks per worker.
+    Falls back to inline execution if the pool cannot be used.
+    """
+    items = list(items)
+    jobs = min(resolve_jobs(jobs), len(items))
+    if jobs <= 1 or len(items) < min_items:
+        return [fn(item) for item in items]
+
+    if chunk_size is None:
+        chunk_size = max(1, len(items) // (jobs * 4))
+    try:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            return list(executor.map(fn, items, chunksize=chunk_size))
+    except (OSError, RuntimeError) as e:
+        # e.g. restricted environments without working multiprocessing primitives
+        logger.debug(f"Process pool unavailable ({e}), running inline.")
+        return [fn(item) for item in items]
@@ -1,31 +1,149 @@
+import codecs
+import os
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 from loguru import logger
 
+from . import sniff
 
-def read_file_content(path: Path, add_line_numbers: bool = True) -> str:
+# What happens to files above [filter] max_file_size_kb
+LARGE_FILE_POLICIES = ("include", "truncate", "excerpt", "skip")
+
+
+@dataclass
+class SizePolicy:
+    """[filter] max_file_size_kb + large_file_policy."""
+    max_bytes: int = 0          # 0 = no limit
+    action: str = "truncate"    # include | truncate | excerpt | skip
+
+    def action_for(self, size: int) -> str:
+        if not self.max_bytes or size <= self.max_bytes or self.action not in LARGE_FILE_POLICIES:
+            return "include"
+        return self.action
+
+    def output_size(self, size: int) -> int:
+        """Bytes of the file that end up in the output (0 for skipped files)."""
+        action = self.action_for(size)
+        if action == "skip":
+            return 0
+        if action in ("truncate", "excerpt"):
+            return self.max_bytes
+        return size
+
+
+def _decode_head(data: bytes) -> str:
+    """Decodes a prefix, cut back to the last complete line (if any)."""
+    text = codecs.getincrementaldecoder("utf-8")().decode(data, final=False)
+    cut = text.rfind("\n")
+    return text[:cut + 1] if cut != -1 else text
+
+
+def _decode_tail(data: bytes) -> str:
+    """Decodes a suffix, starting at the first complete line (if any)."""
+    start = 0
+    while start < min(len(data), 4) and 0x80 <= data[start] < 0xC0:
+        start += 1
+    text = data[start:].decode("utf-8")
+    cut = text.find("\n")
+    return text[cut + 1:] if cut != -1 else text
+
+
+def _universal_newlines(text: str) -> str:
+    """Same newline translation as reading in text mode."""
+    if "\r" not in text:
+        return text
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _format_size(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+def binary_placeholder(kind: str, size: int) -> str:
+    """Compact stand-in for content that is not shown (type + size)."""
+    return f"<<Binary: {kind}, {_format_size(size)}>>"
+
+
+def read_body(f, size: int, policy: Optional[SizePolicy]) -> str:
+    """
+    Reads the (already classified) open binary file: whole, or at most
+    policy.max_bytes of it, as the head (truncate) or head + tail (excerpt).
+    Text is the same the snapshot shows (universal newlines, policy markers).
+    Raises UnicodeDecodeError on invalid UTF-8.
+    """
+    action = policy.action_for(size) if policy is not None else "include"
+    if action not in ("truncate", "excerpt"):
+        return _universal_newlines(f.read().decode("utf-8"))
+
+    limit = policy.max_bytes
+    size_kb = size // 1024
+    if action == "truncate":
+        head = _universal_newlines(_decode_head(f.read(limit)))
+        return f"{head}<<Truncated: first {limit // 1024} KB of {size_kb} KB>>"
+
+    half = limit // 2
+    head = _universal_newlines(_decode_head(f.read(half)))
+    f.seek(size - half)
+    tail = _universal_newlines(_decode_tail(f.read(half)))
+    omitted_kb = (size - 2 * half) // 1024
+    return f"{head}<<Excerpt: {omitted_kb} KB of {size_kb} KB omitted>>\n{tail}"
+
+
+def read_text(path: Path, policy: Optional[SizePolicy] = None, kind: Optional[str] = None) -> tuple[str, bool]:
     """
-    Reads file content safely. Returns an error message string if binary/unreadable.
+    Reads raw UTF-8 text (bounded by the size policy, if given).
+    The first few KB are sniffed before anything else is read, unless the
+    caller already knows the `kind` (e.g. from the scan index).
+    Returns (content, True), or (placeholder message, False) if binary/unreadable.
     """
+    size = 0
     try:
-        content = path.read_text(encoding="utf-8")
-        
-        if not add_line_numbers:
-            return content
-            
-        lines = content.splitlines()
-        if not lines:
-            return ""
-
-        # 라인 넘버 패딩 계산 (100줄이면 3칸 확보)
-        width = len(str(len(lines)))
-        
-        return "\n".join(
-            f"{i+1:>{width}}: {line}" 
-            for i, line in enumerate(lines)
-        )
-        
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if kind is None:
+                head = f.read(sniff.SNIFF_BYTES)
+                kind = sniff.classify(head, whole=len(head) < sniff.SNIFF_BYTES)
+                f.seek(0)
+            if kind != sniff.TEXT:
+                return binary_placeholder(kind, size), False
+            return read_body(f, size, policy), True
     except UnicodeDecodeError:
-        return "<<Binary or Non-UTF8 Content>>"
+        # Passed the sniff, but invalid UTF-8 further in
+        return binary_placeholder("non-UTF-8 data", size), False
     except Exception as e:
         logger.warning(f"Error reading {path}: {e}")
-        return f"<<Error: {e}>>"
\ No newline at end of file
+        return f"<<Error: {e}>>", False
+
+
+def number_lines(content: str) -> str:
+    lines = content.splitlines()
+    if not lines:
+        return ""
+
+    # 라인 넘버 패딩 계산 (100줄이면 3칸 확보)
+    width = len(str(len(lines)))
+
+    return "\n".join(
+        f"{i+1:>{width}}: {line}"
+        for i, line in enumerate(lines)
+    )
+
+
+def read_file_content(
+    path: Path,
+    add_line_numbers: bool = True,
+    policy: Optional[SizePolicy] = None,
+    kind: Optional[str] = None
+) -> str:
+    """
+    Reads file content safely. Returns a placeholder string if binary/unreadable.
+    """
+    content, ok = read_text(path, policy, kind)
+    if not ok or not add_line_numbers:
+        return content
+    return number_lines(content)
@@ -2,7 +2,9 @@
 Prompt Management Module.
 Templates are aligned flush-left to prevent indentation issues when injecting large code blocks.
 """
+import re
 import tomllib
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Callable, Dict
 from . import tags
@@ -10,6 +12,21 @@ from . import tags
 # RenderFunction takes keyword arguments and returns a processed string
 RenderFunc = Callable[..., str]
 
+_STREAM_SENTINEL = "@@CODIGEST_STREAM_{}@@"
+_STREAM_SPLIT = re.compile(r"@@CODIGEST_STREAM_(\w+)@@")
+
+@dataclass
+class StreamTemplate:
+    """
+    A rendered template with holes for streamed fields:
+    parts[0] fields[0] parts[1] fields[1] ... parts[-1]
+    Streamed chunks must go through `transform` (the escaping/normalization
+    the renderer would have applied to the full value).
+    """
+    parts: list[str]
+    fields: list[str]
+    transform: Callable[[str], str]
+
 # 1. Snapshot Template (codigest scan)
 def _default_snapshot(project_name: str, tree_structure: str, source_code: str, instruction: str = "") -> str:
     instruction_block = ""
@@ -171,5 +188,19 @@ class PromptEngine:
 
         return f"Error: Prompt template '{key}' not found."
 
+    def render_stream(self, key: str, stream_fields: list[str], **kwargs) -> StreamTemplate:
+        """
+        Renders a prompt with placeholders for `stream_fields`, so large values
+        (tree, source code) can be written chunk by chunk instead of held in memory.
+        """
+        for field in stream_fields:
+            kwargs[field] = _STREAM_SENTINEL.format(field)
+        rendered = self.render(key, **kwargs)
+
+        pieces = _STREAM_SPLIT.split(rendered)
+        # TOML overrides escape every value; defaults only normalize whitespace (dedent)
+        transform = tags.escape_xml_value if key in self.overrides else tags.normalize_ws
+        return StreamTemplate(parts=pieces[0::2], fields=pieces[1::2], transform=transform)
+
 def get_engine(root_path: Path) -> PromptEngine:
     return PromptEngine(root_path)
@@ -1,16 +1,301 @@
 """
 Dependency Resolver Module.
-Analyzes Python AST to resolve local imports recursively.
+Analyzes Python imports to resolve local imports recursively.
 Optimized: Stdlib check -> Cache -> Local File Check.
+Import graph: the raw imports of each file are cached by content hash
+(ContentCache "imports:v1"), so unchanged files are never read or parsed again;
+only resolution (cheap, in-memory cached) runs on every invocation.
+
+Import scanners (same result on valid code):
+  - tokens: walks the token stream only, no AST is built (default)
+  - ast:    full ast.parse; also the fallback whenever the token scan is unsure
 """
 import ast
+import io
+import itertools
 import sys
+import tokenize
+from dataclasses import dataclass, field
+from functools import partial
 from pathlib import Path
+from typing import Iterator, Optional
+
+try:
+    from _tokenize import TokenizerIter as _TokenizerIter
+except ImportError:
+    _TokenizerIter = None
+
+from . import parallel, tokenizer
+from .cache import ContentCache
+from .index import ScanIndex
+from .modules import ModuleIndex
+
+# Content-cache namespace for raw import lists (bump when the spec format changes)
+IMPORTS_NAMESPACE = "imports:v1"
+
+# (dotted target, relative level)
+ImportSpec = tuple[str, int]
+
+IMPORT_SCANNERS = ("tokens", "ast")
+
+# Nodes that can contain import statements (expressions never do)
+_STATEMENT_CONTAINERS = (ast.stmt, ast.excepthandler, ast.match_case)
+
+_SKIPPED = {tokenize.NL, tokenize.COMMENT}
+
+
+def scan_imports(code: str | bytes, strategy: str = "tokens") -> list[ImportSpec]:
+    """
+    Every import target in a module, in source order (duplicates dropped).
+    The AST path raises SyntaxError/ValueError for code that does not parse;
+    the token path is best-effort there.
+    """
+    if strategy == "tokens":
+        if not (b"import" if isinstance(code, bytes) else "import") in code:
+            return []
+        try:
+            return scan_imports_tokens(code)
+        except _Undecided:
+            pass
+        except (SyntaxError, tokenize.TokenError):
+            # Let the AST path decide what the error is
+            pass
+    return scan_imports_ast(code)
+
+
+def scan_imports_ast(code: str | bytes) -> list[ImportSpec]:
+    """
+    AST-based scanner.
+    Only statement-level nodes are visited, expression subtrees are skipped.
+    """
+    tree = ast.parse(code)
+    specs: dict[ImportSpec, None] = {}
+    stack = list(reversed(tree.body))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                # Case: import my_module
+                specs[(alias.name, 0)] = None
+        elif isinstance(node, ast.ImportFrom):
+            module_name = node.module if node.module else ""
+            # Case: from . import module
+            if module_name:
+                specs[(module_name, node.level)] = None
+            # Case: from my_pkg import my_module
+            for alias in node.names:
+                full_target = f"{module_name}.{alias.name}" if module_name else alias.name
+                specs[(full_target, node.level)] = None
+        else:
+            children = [c for c in ast.iter_child_nodes(node) if isinstance(c, _STATEMENT_CONTAINERS)]
+            stack.extend(reversed(children))
+    return list(specs)
+
+
+def _fast_tokens_work() -> bool:
+    """
+    The private C iterator (and its keyword signature) may change between
+    CPython versions: it is only used if it produces the same (type, string)
+    stream as the public tokenize API on a probe, for both str and bytes input.
+    """
+    if _TokenizerIter is None:
+        return False
+    probe = "from . import a as b\nimport c.d  # e\n"
+    try:
+        expected = [t[:2] for t in tokenize.generate_tokens(io.StringIO(probe).readline)]
+        from_str = [t[:2] for t in _TokenizerIter(io.StringIO(probe).readline, extra_tokens=True)]
+        lines = iter(io.BytesIO(probe.encode()).readline, b"")
+        from_bytes = [t[:2] for t in _TokenizerIter(lines.__next__, encoding="utf-8", extra_tokens=True)]
+    except Exception:
+        return False
+    return from_str == expected and from_bytes == expected
+
+
+if not _fast_tokens_work():
+    _TokenizerIter = None
+
+
+class _Undecided(Exception):
+    """Token stream did not look like valid import syntax: defer to the AST scanner."""
+
+
+def _import_tokens(code: str | bytes) -> Iterator[tuple]:
+    """
+    Token tuples (type, string, start, end, line).
+    Uses the C tokenizer iterator directly when it passed the import-time probe:
+    same tokens as tokenize.tokenize, without building a TokenInfo per token.
+    Otherwise the public tokenize API (same C tokenizer, TokenInfo objects).
+    """
+    if isinstance(code, bytes):
+        readline = io.BytesIO(code).readline
+        encoding, consumed = tokenize.detect_encoding(readline)
+        lines = itertools.chain(consumed, iter(readline, b""))
+        if _TokenizerIter is None:
+            return tokenize.tokenize(io.BytesIO(code).readline)
+        if encoding == "utf-8-sig":
+            encoding = "utf-8"
+        return _TokenizerIter(lines.__next__, encoding=encoding, extra_tokens=True)
+
+    if _TokenizerIter is None:
+        return tokenize.generate_tokens(io.StringIO(code).readline)
+    return _TokenizerIter(io.StringIO(code).readline, extra_tokens=True)
+
+
+def scan_imports_tokens(code: str | bytes) -> list[ImportSpec]:
+    """
+    Token-based scanner.
+    `import` is a hard keyword, so every NAME token "import" belongs to an import
+    statement, at any nesting depth. `from` only starts one at a statement
+    boundary (not in `yield from` / `raise ... from`). Only the tokens of
+    import statements are interpreted; everything else is skipped.
+    """
+    specs: dict[ImportSpec, None] = {}
+    tokens = _import_tokens(code)
+
+    def _next():
+        for tok in tokens:
+            if tok[0] not in _SKIPPED:
+                return tok
+        raise _Undecided()
+
+    def _dotted(tok) -> tuple[str, tuple]:
+        """NAME ('.' NAME)* starting at tok; returns the name and the following token."""
+        if tok[0] != tokenize.NAME:
+            raise _Undecided()
+        parts = [tok[1]]
+        tok = _next()
+        while tok[1] == ".":
+            name = _next()
+            if name[0] != tokenize.NAME:
+                raise _Undecided()
+            parts.append(name[1])
+            tok = _next()
+        return ".".join(parts), tok
+
+    def _alias(tok) -> tuple:
+        """Skips an optional `as NAME`; returns the following token."""
+        if tok[0] == tokenize.NAME and tok[1] == "as":
+            if _next()[0] != tokenize.NAME:
+                raise _Undecided()
+            tok = _next()
+        return tok
+
+    def _end(tok):
+        if not (tok[0] in (tokenize.NEWLINE, tokenize.ENDMARKER) or tok[1] == ";"):
+            raise _Undecided()
+
+    for tok in tokens:
+        keyword = tok[1]
+        if (keyword != "import" and keyword != "from") or tok[0] != tokenize.NAME:
+            continue
+
+        if keyword == "import":
+            # Case: import my_module
+            tok = _next()
+            while True:
+                name, tok = _dotted(tok)
+                specs[(name, 0)] = None
+                tok = _alias(tok)
+                if tok[1] != ",":
+                    break
+                tok = _next()
+            _end(tok)
+            continue
+
+        # "from" starts an import only at a statement boundary: nothing but
+        # indentation before it on its line, or a ';' / compound-statement ':'
+        # (a continued `raise ... from` lands here too and is deferred via _Undecided)
+        before = tok[4][:tok[2][1]].rstrip()
+        if before and before[-1] not in ";:":
+            continue
+
+        level = 0
+        module_name = ""
+        tok = _next()
+        while tok[0] == tokenize.OP and tok[1] in (".", "..."):
+            level += len(tok[1])
+            tok = _next()
+        if not (tok[0] == tokenize.NAME and tok[1] == "import"):
+            module_name, tok = _dotted(tok)
+            if not (tok[0] == tokenize.NAME and tok[1] == "import"):
+                raise _Undecided()
+        # Case: from . import module
+        if module_name:
+            specs[(module_name, level)] = None
+
+        tok = _next()
+        parenthesized = tok[1] == "("
+        if parenthesized:
+            tok = _next()
+        while True:
+            if tok[1] == "*":
+                name, tok = "*", _next()
+            elif tok[0] == tokenize.NAME:
+                name, tok = tok[1], _alias(_next())
+            else:
+                raise _Undecided()
+            # Case: from my_pkg import my_module
+            full_target = f"{module_name}.{name}" if module_name else name
+            specs[(full_target, level)] = None
+            if tok[1] != ",":
+                break
+            tok = _next()
+            if parenthesized and tok[1] == ")":
+                break
+        if parenthesized:
+            if tok[1] != ")":
+                raise _Undecided()
+            tok = _next()
+        _end(tok)
+
+    return list(specs)
+
+
+def _scan_specs(content: bytes, strategy: str = "tokens") -> list[ImportSpec]:
+    """Pool task: import specs of one file ([] for code that does not parse)."""
+    try:
+        return scan_imports(content, strategy)
+    except (SyntaxError, ValueError, RecursionError):
+        return []
+
+
+@dataclass
+class ResolveResult:
+    files: list[Path]           # Selected files (initial files + included dependencies), sorted
+    frontier: list[Path]        # Reachable dependencies left out by the limits, best ranked first
+    tokens: int                 # Estimated tokens of `files`
+    cut_by: str = ""            # "" (complete closure) | "depth" | "budget"
+    depths: dict[Path, int] = field(default_factory=dict)  # Import hops from the initial files
+
+
+def _rank(candidates: list[Path], fan_in: dict[Path, int]) -> list[Path]:
+    """Within one BFS level: most imported first, then by path."""
+    return sorted(candidates, key=lambda p: (-fan_in.get(p, 0), p))
+
 
 class DependencyResolver:
-    def __init__(self, root_path: Path):
+    def __init__(
+            self,
+            root_path: Path,
+            index: Optional[ScanIndex] = None,
+            cache: Optional[ContentCache] = None,
+            import_scanner: str = "tokens",
+            jobs: int = 0,
+            modules: Optional[ModuleIndex] = None,
+            token_counter: Optional[tokenizer.FileTokenCounter] = None
+            ):
         self.root_path = root_path.resolve()
+        self.import_scanner = import_scanner if import_scanner in IMPORT_SCANNERS else "tokens"
+        # Scanner processes per frontier (0 = one per CPU; small frontiers run inline)
+        self.jobs = jobs
         self.visited: set[Path] = set()
+        # Content hashes by stat (index) and raw imports by content hash (cache)
+        self.index = index if index is not None else ScanIndex(None)
+        self.cache = cache
+        # Module locations from the scanned file list (None = probe the file system)
+        self.modules = modules
+        # Cached per-file token counts for the budget (None = size estimate)
+        self.token_counter = token_counter
         
         self.resolve_cache: dict[str, Path | None] = {}
 
@@ -29,59 +314,132 @@ class DependencyResolver:
             }
 
     def resolve(self, initial_files: list[Path]) -> list[Path]:
-        queue = [f.resolve() for f in initial_files if f.suffix == ".py"]
-        self.visited = set(queue)
+        """Full transitive closure of local imports (initial files included)."""
+        return self.resolve_ranked(initial_files).files
+
+    def resolve_ranked(
+        self,
+        initial_files: list[Path],
+        max_depth: Optional[int] = None,
+        token_budget: Optional[int] = None
+    ) -> "ResolveResult":
+        """
+        Level-synchronous BFS over the import graph.
+        Each frontier's import lists are loaded as one batch (cache hits inline,
+        misses scanned on the process pool); resolution then runs in frontier
+        order, so the result does not depend on the worker count.
+
+        max_depth:    import hops followed from the initial files (None = unlimited)
+        token_budget: estimated tokens for the whole selection; the initial files
+                      always count, dependencies are added nearest first and, within
+                      a level, by fan-in until the next one would exceed the budget
+        Dependencies that were reachable but not taken are reported as the frontier.
+        """
+        frontier = list(dict.fromkeys(f.resolve() for f in initial_files if f.suffix == ".py"))
+        self.visited = set(frontier)
         results = set(initial_files)
+        fan_in: dict[Path, int] = {}
+        tokens = sum(self._estimate_tokens(list(results)).values())
+        result = ResolveResult([], [], tokens)
+        result.depths = {f: 0 for f in results}
 
-        while queue:
-            current_file = queue.pop(0)
-            try:
-                dependencies = self._get_imports(current_file)
-            except Exception:
-                continue
+        depth = 0
+        while frontier:
+            next_frontier = []
+            for current_file, specs in zip(frontier, self._load_specs_many(frontier)):
+                for dep_path in self._resolve_specs(current_file, specs):
+                    fan_in[dep_path] = fan_in.get(dep_path, 0) + 1
+                    if dep_path not in self.visited:
+                        self.visited.add(dep_path)
+                        next_frontier.append(dep_path)
+            depth += 1
 
-            for dep_path in dependencies:
-                if dep_path not in self.visited:
-                    self.visited.add(dep_path)
-                    queue.append(dep_path)
-                    results.add(dep_path)
-        
-        return sorted(list(results))
+            if not next_frontier:
+                break
+            if max_depth is not None and depth > max_depth:
+                result.frontier = _rank(next_frontier, fan_in)
+                result.cut_by = "depth"
+                break
 
-    def _get_imports(self, file_path: Path) -> set[Path]:
-        local_deps = set()
-        try:
-            content = file_path.read_text(encoding="utf-8")
-            tree = ast.parse(content)
-        except Exception:
-            return local_deps
-
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Import):
-                for alias in node.names:
-                    # Case: import my_module
-                    path = self._check_cache_and_resolve(alias.name, 0, file_path)
-                    if path:
-                        local_deps.add(path)
-            
-            elif isinstance(node, ast.ImportFrom):
-                module_name = node.module if node.module else ""
-                level = node.level
+            if token_budget is not None:
+                taken = set()
+                costs = self._estimate_tokens(next_frontier)
+                for i, dep_path in enumerate(_rank(next_frontier, fan_in)):
+                    cost = costs[dep_path]
+                    if result.tokens + cost > token_budget:
+                        result.frontier = _rank(next_frontier, fan_in)[i:]
+                        result.cut_by = "budget"
+                        break
+                    result.tokens += cost
+                    taken.add(dep_path)
+                # Expansion keeps discovery order (resolution order stays deterministic)
+                next_frontier = [p for p in next_frontier if p in taken]
+            else:
+                result.tokens += sum(self._estimate_tokens(next_frontier).values())
 
-                # Case: from . import module
-                if module_name:
-                    path = self._check_cache_and_resolve(module_name, level, file_path)
-                    if path:
-                        local_deps.add(path)
+            results.update(next_frontier)
+            result.depths.update((p, depth) for p in next_frontier)
+            if result.cut_by:
+                break
+            frontier = next_frontier
 
-                # Case: from my_pkg import my_module
-                for alias in node.names:
-                    full_target = f"{module_name}.{alias.name}" if module_name else alias.name
-                    path = self._check_cache_and_resolve(full_target, level, file_path)
-                    if path:
-                        local_deps.add(path)
+        result.files = sorted(list(results))
+        return result
 
-        return local_deps
+    def _estimate_tokens(self, files: list[Path]) -> dict[Path, int]:
+        """Token cost per file: counted (and cached) by the token counter, or from the size."""
+        if self.token_counter is not None:
+            return self.token_counter.count_many(files)
+        costs = {}
+        for file_path in files:
+            try:
+                costs[file_path] = tokenizer.estimate_tokens_for_size(self.index.stat(file_path).size)
+            except OSError:
+                costs[file_path] = 0
+        return costs
+
+    def _load_specs_many(self, files: list[Path]) -> list[list[ImportSpec]]:
+        """
+        Raw imports of each file: cache lookup by content hash, scan only on a miss.
+        Misses are read here and scanned on up to `jobs` processes.
+        """
+        results: list[list[ImportSpec]] = [[] for _ in files]
+        misses: list[tuple[int, str, bytes]] = []
+        for i, file_path in enumerate(files):
+            try:
+                # A stat-fresh index record already knows the hash: no read needed on a cache hit
+                content = None
+                content_key = self.index.stat(file_path).content_hash
+                if not content_key:
+                    content = file_path.read_bytes()
+                    content_key = self.index.content_hash(file_path, content)
+                if self.cache is not None:
+                    cached = self.cache.get_json(IMPORTS_NAMESPACE, content_key)
+                    if cached is not None:
+                        results[i] = [(name, level) for name, level in cached]
+                        continue
+                if content is None:
+                    content = file_path.read_bytes()
+            except OSError:
+                continue
+            misses.append((i, content_key, content))
+
+        scan = partial(_scan_specs, strategy=self.import_scanner)
+        scanned = parallel.map_ordered(scan, [content for _, _, content in misses], self.jobs)
+        for (i, content_key, _), specs in zip(misses, scanned):
+            results[i] = specs
+            if self.cache is not None:
+                self.cache.put_json(IMPORTS_NAMESPACE, content_key, specs)
+        return results
+
+    def _resolve_specs(self, file_path: Path, specs: list[ImportSpec]) -> list[Path]:
+        """Local files imported by file_path, in import order."""
+        local_deps: dict[Path, None] = {}
+        for module_name, level in specs:
+            path = self._check_cache_and_resolve(module_name, level, file_path)
+            if path:
+                local_deps[path] = None
+        return list(local_deps)
 
     def _check_cache_and_resolve(self, module_name: str, level: int, current_file: Path) -> Path | None:
         """Wrapper to handle caching logic."""
@@ -109,12 +467,21 @@ class DependencyResolver:
 
     def _resolve_import_path(self, module_name: str, level: int, current_file: Path) -> Path | None:
         """
-        Physical file system check.
+        Module index lookup, or a physical file system check without one.
         """
         if not module_name:
             return None
 
         parts = module_name.split(".")
+        if self.modules is not None:
+            # Index lookup: no stat calls
+            if level > 0:
+                base_dir = current_file.parent
+                for _ in range(level - 1):
+                    base_dir = base_dir.parent
+                return self.modules.find(base_dir, parts)
+            return self.modules.locate(module_name, current_file)
+
         candidates = []
 
         if level > 0:
@@ -146,6 +513,35 @@ class DependencyResolver:
 
         return None
 
-def resolve_dependencies(root_path: Path, files: list[Path]) -> list[Path]:
-    resolver = DependencyResolver(root_path)
-    return resolver.resolve(files)
\ No newline at end of file
+def resolve_dependencies(
+    root_path: Path,
+    files: list[Path],
+    index: Optional[ScanIndex] = None,
+    cache: Optional[ContentCache] = None,
+    import_scanner: str = "tokens",
+    jobs: int = 0,
+    modules: Optional[ModuleIndex] = None
+) -> list[Path]:
+    resolver = DependencyResolver(
+        root_path, index=index, cache=cache, import_scanner=import_scanner, jobs=jobs, modules=modules
+    )
+    return resolver.resolve(files)
+
+def resolve_limited(
+    root_path: Path,
+    files: list[Path],
+    max_depth: Optional[int] = None,
+    token_budget: Optional[int] = None,
+    index: Optional[ScanIndex] = None,
+    cache: Optional[ContentCache] = None,
+    import_scanner: str = "tokens",
+    jobs: int = 0,
+    modules: Optional[ModuleIndex] = None,
+    token_counter: Optional[tokenizer.FileTokenCounter] = None
+) -> ResolveResult:
+    """Depth/budget-limited resolution with the cut-off frontier reported."""
+    resolver = DependencyResolver(
+        root_path, index=index, cache=cache, import_scanner=import_scanner, jobs=jobs, modules=modules,
+        token_counter=token_counter
+    )
+    return resolver.resolve_ranked(files, max_depth=max_depth, token_budget=token_budget)
\ No newline at end of file
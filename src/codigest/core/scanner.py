@@ -1,11 +1,28 @@
 """
 Core File System Scanner.
+Discovery backends:
+  - walk: scandir-based DirectoryWalker (any directory)
+  - git:  single `git ls-files` call, then codigest-specific filters only
+  - auto: git for git repositories, walk otherwise
 """
-import pathspec
+import os
 from pathlib import Path
 from typing import Optional
 from loguru import logger
 
+from . import git_ops
+from .ignore import IgnoreEngine
+from .walker import DirectoryWalker
+
+BACKENDS = ("auto", "walk", "git")
+
+def _path_sort_key(path: Path) -> list[str]:
+    """Same order as Path.__lt__, without building the key on every comparison."""
+    return os.path.normcase(str(path)).split(os.sep)
+
+def _sorted_unique(paths: list[Path]) -> list[Path]:
+    return sorted(set(paths), key=_path_sort_key)
+
 # Default "Safe" ignores
 ALWAYS_IGNORE = [
     ".git/", ".codigest/",
@@ -21,47 +38,53 @@ class ProjectScanner:
             root_path: Path,
             extensions: Optional[set[str]] = None,
             extra_ignores: Optional[list[str]] = None,
-            include_paths: Optional[list[Path]] = None
+            include_paths: Optional[list[Path]] = None,
+            workers: int = 1,
+            index=None,
+            backend: str = "auto"
             ):
         self.root_path = root_path
         self.extensions = extensions
         self.extra_ignores = extra_ignores or []
         self.ignore_spec = self._load_gitignore()
         self.include_paths = include_paths
+        self.workers = workers
+        self.index = index
+        self.backend = backend if backend in BACKENDS else "auto"
 
-    def _load_gitignore(self) -> pathspec.PathSpec:
-        """Loads .gitignore and combines with ALWAYS_IGNORE and extra_ignores."""
-        patterns = list(ALWAYS_IGNORE)
-        
-        # Add config-based ignores
-        if self.extra_ignores:
-            patterns.extend(self.extra_ignores)
+    def _load_gitignore(self) -> IgnoreEngine:
+        """
+        Combines ALWAYS_IGNORE and extra_ignores with .git/info/exclude and
+        the root .gitignore. Nested .gitignore files load as the walk descends.
+        """
+        # ALWAYS_IGNORE + config-based ignores
+        return IgnoreEngine(self.root_path, self._codigest_patterns())
 
-        gitignore_path = self.root_path / ".gitignore"
-        if gitignore_path.exists():
-            try:
-                with open(gitignore_path, "r", encoding="utf-8") as f:
-                    user_patterns = [
-                        line.strip() for line in f 
-                        if line.strip() and not line.startswith("#")
-                    ]
-                    patterns.extend(user_patterns)
-            except Exception as e:
-                logger.warning(f"Failed to read .gitignore: {e}")
-                
-        return pathspec.PathSpec.from_lines("gitwildmatch", patterns)
+    def _select_backend(self) -> str:
+        if self.backend != "auto":
+            return self.backend
+        if not git_ops.is_git_repo(self.root_path):
+            return "walk"
+        # ls-files does not list submodule contents; the walker descends into them
+        if (self.root_path / ".gitmodules").exists():
+            return "walk"
+        # Scopes outside the repository cannot come from its index
+        if self.include_paths and not all(p.is_relative_to(self.root_path) for p in self.include_paths):
+            return "walk"
+        return "git"
 
     def is_ignored(self, path: Path) -> bool:
         """Checks if a path matches the ignore patterns."""
         try:
-            # pathspec requires relative paths (e.g., "src/main.py")
+            # Patterns match relative paths (e.g., "src/main.py")
             rel_path = path.relative_to(self.root_path).as_posix()
-            if path.is_dir():
+            is_dir = path.is_dir()
+            if is_dir:
                 rel_path += "/"
         except ValueError:
             return False
-            
-        return self.ignore_spec.match_file(rel_path)
+
+        return self.ignore_spec.is_ignored(rel_path, is_dir)
 
     def _is_included(self, entry: Path) -> bool:
         """파일이 지정된 include_paths 범위 안에 있는지 확인"""
@@ -76,56 +99,125 @@ class ProjectScanner:
                 continue
         return False
 
+    def _match_rel(self, rel_path: str, is_dir: bool) -> bool:
+        """Walker hook: rel_path is already relative (and '/'-suffixed for dirs)."""
+        return self.ignore_spec.is_ignored(rel_path, is_dir)
+
+    def _accept_file(self, entry: Path) -> bool:
+        """Extension Filter Check"""
+        if self.extensions and entry.suffix.lower() not in self.extensions:
+            # Allow specific config files even if extension doesn't match
+            return entry.name in {".gitignore", "Dockerfile", "pyproject.toml"}
+        return True
+
     def scan(self) -> list[Path]:
         """
-        Walks the directory tree and returns valid files.
-        (Modernized from old core.py's stack-based approach)
+        Returns valid files using the selected discovery backend.
+        The git backend falls back to walking if git fails.
         """
-        valid_files = []
+        if self._select_backend() == "git":
+            files = self._scan_git()
+            if files is not None:
+                return files
+            logger.debug("git ls-files unavailable, falling back to directory walk")
+        return self._scan_walk()
+
+    def _split_start_paths(self) -> tuple[list[Path], list[Path]]:
+        """Explicit file targets (kept if not ignored) and directories to traverse."""
+        files = []
+        dirs = []
         start_dirs = self.include_paths if self.include_paths else [self.root_path]
-        # Use rglob for simplicity, but we must manually filter dirs to respect gitignore
-        # For better performance on large repos, we use a manual walk similar to the old code
-        dirs_stack = []
         for p in start_dirs:
             if p.is_file():
                 if not self.is_ignored(p):
-                    valid_files.append(p)
+                    files.append(p)
             elif p.is_dir():
-                dirs_stack.append(p)
+                dirs.append(p)
+        return files, dirs
 
-        while dirs_stack:
-            current = dirs_stack.pop()
-            
-            try:
-                # Sort for deterministic output (LLMs like order)
-                entries = sorted(current.iterdir(), key=lambda x: x.name)
-            except PermissionError:
-                logger.debug(f"Permission denied: {current}")
+    def _scan_walk(self) -> list[Path]:
+        """
+        Walks the directory tree and returns valid files.
+        Delegates the traversal to the scandir-based DirectoryWalker.
+        """
+        valid_files, walk_dirs = self._split_start_paths()
+        if self.index is not None:
+            self.index.load_scope(walk_dirs)
+
+        valid_files.extend(self._walker().walk(walk_dirs))
+
+        valid_files = _sorted_unique(valid_files)
+        if self.index is not None:
+            self.index.mark_scanned(walk_dirs, valid_files)
+        return valid_files
+
+    def _walker(self) -> DirectoryWalker:
+        return DirectoryWalker(
+            self.root_path,
+            is_ignored=self._match_rel,
+            accept_file=self._accept_file,
+            workers=self.workers,
+            index=self.index
+        )
+
+    def _scan_git(self) -> Optional[list[Path]]:
+        """
+        Takes the file list from git (which already applied .gitignore)
+        and applies only ALWAYS_IGNORE, config excludes and extensions.
+        Untracked nested repositories ("dir/" entries) are walked instead.
+        """
+        rel_files = git_ops.list_files(self.root_path)
+        if rel_files is None:
+            return None
+
+        valid_files, walk_dirs = self._split_start_paths()
+        if self.index is not None:
+            self.index.load_scope(walk_dirs, dirs=False)
+        scopes = []
+        for d in walk_dirs:
+            rel = d.relative_to(self.root_path).as_posix()
+            scopes.append("" if rel == "." else rel + "/")
+
+        codigest_rules = IgnoreEngine(self.root_path, self._codigest_patterns(), vcs_files=False)
+
+        nested_dirs = []
+        for rel in rel_files:
+            if rel.endswith("/"):
+                for scope in scopes:
+                    if rel.startswith(scope):
+                        nested_dirs.append(self.root_path / rel)
+                    elif scope.startswith(rel):
+                        # Scope inside the nested repository: git listed nothing there
+                        nested_dirs.append(self.root_path / scope)
+                continue
+            if not any(rel.startswith(scope) for scope in scopes):
                 continue
-                
-            for entry in entries:
-                if self.is_ignored(entry):
-                    continue
-                
-                if entry.is_dir():
-                    dirs_stack.append(entry)
-
-                elif entry.is_file():
-                    # Extension Filter Check
-                    if self.extensions and entry.suffix.lower() not in self.extensions:
-                        # Allow specific config files even if extension doesn't match
-                        if entry.name not in {".gitignore", "Dockerfile", "pyproject.toml"}:
-                            continue
-                            
-                    valid_files.append(entry)
-
-        return sorted(list(set(valid_files)))
+            if codigest_rules.is_path_ignored(rel):
+                continue
+            path = self.root_path / rel
+            if self._accept_file(path):
+                valid_files.append(path)
+
+        if nested_dirs:
+            valid_files.extend(self._walker().walk(nested_dirs))
+
+        valid_files = _sorted_unique(valid_files)
+        if self.index is not None:
+            # Directories were not listed (except nested repositories): keep their rows
+            self.index.mark_scanned(walk_dirs, valid_files, dirs=False)
+        return valid_files
+
+    def _codigest_patterns(self) -> list[str]:
+        return list(ALWAYS_IGNORE) + list(self.extra_ignores)
 
 def scan_project(
     root_path: Path, 
     extensions: set[str] | None = None, 
     extra_ignores: list[str] | None = None, 
-    include_paths: list[Path] | None = None
+    include_paths: list[Path] | None = None,
+    workers: int = 1,
+    index=None,
+    backend: str = "auto"
 ) -> list[Path]:
-    scanner = ProjectScanner(root_path, extensions, extra_ignores, include_paths)
+    scanner = ProjectScanner(root_path, extensions, extra_ignores, include_paths, workers, index, backend)
     return scanner.scan()
\ No newline at end of file
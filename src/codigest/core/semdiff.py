@@ -5,8 +5,27 @@ Detects: Signature Changes AND Logic Body Changes.
 """
 import ast
 import hashlib
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Any
+from dataclasses import astuple, dataclass
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Any
+
+from . import parallel
+from .cache import ContentCache
+
+# Content-cache namespace for symbol tables (bump when SymbolInfo/hashing changes)
+SYMBOLS_NAMESPACE = "symbols:v2"
+
+_DOCSTRING_OWNERS = {ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef}
+_MEMBER_DEFS = {ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef}
+_CONTEXTS = {ast.Load, ast.Store, ast.Del}
+_TYPE_TAGS: dict[type, bytes] = {}
+
+def _type_tag(cls: type) -> bytes:
+    tag = _TYPE_TAGS.get(cls)
+    if tag is None:
+        tag = _TYPE_TAGS[cls] = cls.__name__.encode() + b"("
+    return tag
 
 @dataclass
 class SymbolInfo:
@@ -15,6 +34,7 @@ class SymbolInfo:
     signature: str
     content_hash: str # For logic change detection
     docstring: Optional[str] = None
+    shell_hash: str = "" # Classes: hash without member defs ("only members changed")
 
 @dataclass
 class SemanticChange:
@@ -22,18 +42,93 @@ class SemanticChange:
     symbol: SymbolInfo
     details: str = ""
 
+def _is_docstring(stmt: ast.stmt) -> bool:
+    return (
+        isinstance(stmt, ast.Expr)
+        and isinstance(stmt.value, ast.Constant)
+        and isinstance(stmt.value.value, str)
+    )
+
+class StructuralHasher:
+    """
+    Merkle-style AST hashing in a single traversal.
+    A def is hashed from a canonical serialization of its subtree in which
+    nested defs appear only as their own (memoized) digests, so a class hash
+    reuses its method hashes instead of re-walking them. Positions
+    (lineno/col_offset) are attributes, not fields, so formatting never matters.
+    """
+    def __init__(self, ignore_docstrings: bool = False):
+        self.ignore_docstrings = ignore_docstrings
+        self._memo: dict[int, bytes] = {}
+
+    def _serialize(self, node: ast.AST, out: list, skip_members: bool = False):
+        append = out.append
+        append(_type_tag(type(node)))
+        for field in node._fields:
+            value = getattr(node, field, None)
+            if type(value) is list:
+                if field == "body":
+                    if self.ignore_docstrings and value and type(node) in _DOCSTRING_OWNERS and _is_docstring(value[0]):
+                        value = value[1:]
+                    if skip_members:
+                        value = [stmt for stmt in value if type(stmt) not in _MEMBER_DEFS]
+                append(b"[%d" % len(value))
+                for item in value:
+                    self._value(item, out)
+            else:
+                self._value(value, out)
+        append(b")")
+
+    def _value(self, value, out: list):
+        append = out.append
+        cls = type(value)
+        if value is None:
+            append(b"~")
+        elif cls in _MEMBER_DEFS:
+            # Merkle link: nested defs contribute their digest, not their subtree
+            append(b"#")
+            append(self.digest(value))
+        elif cls in _CONTEXTS:
+            append(_type_tag(cls))
+        elif isinstance(value, ast.AST):
+            self._serialize(value, out)
+        elif cls is list:
+            append(b"[%d" % len(value))
+            for item in value:
+                self._value(item, out)
+        else:
+            data = repr(value).encode("utf-8", errors="surrogatepass")
+            append(b"<%d:" % len(data))
+            append(data)
+
+    def _hash(self, node: ast.AST, skip_members: bool = False) -> bytes:
+        out: list[bytes] = []
+        self._serialize(node, out, skip_members)
+        return hashlib.blake2b(b"".join(out), digest_size=16).digest()
+
+    def digest(self, node: ast.AST) -> bytes:
+        key = id(node)
+        cached = self._memo.get(key)
+        if cached is None:
+            cached = self._memo[key] = self._hash(node)
+        return cached
+
+    def shell_digest(self, node: ast.AST) -> bytes:
+        """Digest of a class without its member functions/classes."""
+        return self._hash(node, skip_members=True)
+
+
 class CodeParser(ast.NodeVisitor):
-    def __init__(self):
+    def __init__(self, ignore_docstrings: bool = False):
         self.symbols: dict[str, SymbolInfo] = {}
         self.current_class = None
+        self.hasher = StructuralHasher(ignore_docstrings)
 
     def _get_hash(self, node: ast.AST) -> str:
-        """Normalized hash of the node body (ignoring formatting/comments implicitly by unparse)."""
+        """Structural hash of the node (formatting, comments and positions ignored)."""
         try:
-            # ast.unparse returns standardized code string
-            normalized_code = ast.unparse(node)
-            return hashlib.md5(normalized_code.encode('utf-8')).hexdigest()
-        except Exception:
+            return self.hasher.digest(node).hex()
+        except RecursionError:
             return ""
 
     def _get_signature(self, node) -> str:
@@ -75,8 +170,9 @@ class CodeParser(ast.NodeVisitor):
             name=node.name,
             type="class",
             signature=base_str,
-            content_hash=self._get_hash(node), # Hash class structure
-            docstring=ast.get_docstring(node)
+            content_hash=self._get_hash(node), # Hash class structure (reuses member hashes)
+            docstring=ast.get_docstring(node),
+            shell_hash=self.hasher.shell_digest(node).hex()
         )
         
         self.generic_visit(node)
@@ -122,20 +218,97 @@ class CodeParser(ast.NodeVisitor):
                 content_hash=self._get_hash(node)
             )
 
-def parse_code(code: str) -> dict[str, SymbolInfo]:
+def parse_code(code: str | bytes, ignore_docstrings: bool = False) -> dict[str, SymbolInfo]:
     if not code: return {}
     try:
         tree = ast.parse(code)
-        parser = CodeParser()
+        parser = CodeParser(ignore_docstrings)
         parser.visit(tree)
         return parser.symbols
-    except SyntaxError:
+    except (SyntaxError, ValueError, RecursionError):
         return {} 
 
-def compare(old_code: str, new_code: str) -> list[SemanticChange]:
-    old_syms = parse_code(old_code)
-    new_syms = parse_code(new_code)
-    
+def _namespace(ignore_docstrings: bool) -> str:
+    return SYMBOLS_NAMESPACE + (":nodoc" if ignore_docstrings else "")
+
+def parse_rows(code: str | bytes, ignore_docstrings: bool = False) -> list[tuple]:
+    """Symbol table as plain tuples (compact to pickle and to cache). Runs in pool workers."""
+    return [astuple(sym) for sym in parse_code(code, ignore_docstrings).values()]
+
+def _from_rows(rows: list) -> dict[str, SymbolInfo]:
+    return {row[0]: SymbolInfo(*row) for row in rows}
+
+def file_reader(file_path: Path) -> Callable[[], bytes]:
+    """Deferred read for load_symbols_many (an unreadable file parses as empty)."""
+    def _read() -> bytes:
+        try:
+            return file_path.read_bytes()
+        except OSError:
+            return b""
+    return _read
+
+def symbol_request(index, file_path: Path) -> tuple[str, Callable[[], bytes]]:
+    """
+    (content key, read) of a working-tree file for load_symbols_many.
+    Known hashes (ScanIndex) need no read here; otherwise the file is read once
+    and the same bytes serve both the hash and (on a cache miss) the parse.
+    Raises OSError if the file cannot be stat'ed or read.
+    """
+    content_key = index.stat(file_path).content_hash
+    if content_key:
+        return content_key, file_reader(file_path)
+    data = file_path.read_bytes()
+    return index.content_hash(file_path, data), lambda: data
+
+def load_symbols(
+    content_key: str,
+    read: Callable[[], str | bytes],
+    cache: Optional[ContentCache] = None,
+    ignore_docstrings: bool = False
+) -> dict[str, SymbolInfo]:
+    """
+    Symbol table of a file identified by its content hash (git blob id).
+    `read` is only called on a cache miss, so unchanged files are never read or parsed.
+    """
+    return load_symbols_many([(content_key, read)], cache, ignore_docstrings, jobs=1)[0]
+
+def load_symbols_many(
+    requests: list[tuple[str, Callable[[], str | bytes]]],
+    cache: Optional[ContentCache] = None,
+    ignore_docstrings: bool = False,
+    jobs: int = 1,
+    batch_size: int = 2048
+) -> list[dict[str, SymbolInfo]]:
+    """
+    Batch form of load_symbols: [(content_key, read), ...] -> symbol tables in the same order.
+    Cache misses are read in this process and parsed on a process pool (`jobs`, 0 = all cores),
+    `batch_size` files at a time so memory stays bounded.
+    """
+    namespace = _namespace(ignore_docstrings)
+    results: list[Optional[dict[str, SymbolInfo]]] = [None] * len(requests)
+    misses: list[int] = []
+    for i, (content_key, _) in enumerate(requests):
+        rows = cache.get_json(namespace, content_key) if cache is not None else None
+        if rows is None:
+            misses.append(i)
+        else:
+            results[i] = _from_rows(rows)
+
+    parse = partial(parse_rows, ignore_docstrings=ignore_docstrings)
+    for start in range(0, len(misses), batch_size):
+        batch = misses[start:start + batch_size]
+        codes = [requests[i][1]() for i in batch]
+        for i, code, rows in zip(batch, codes, parallel.map_ordered(parse, codes, jobs)):
+            results[i] = _from_rows(rows)
+            # Empty input may be a failed read: never pin it to the content key
+            if cache is not None and code:
+                cache.put_json(namespace, requests[i][0], rows)
+    return results
+
+def compare(old_code: str | bytes, new_code: str | bytes) -> list[SemanticChange]:
+    return compare_symbols(parse_code(old_code), parse_code(new_code))
+
+def compare_symbols(old_syms: dict[str, SymbolInfo], new_syms: dict[str, SymbolInfo]) -> list[SemanticChange]:
     changes = []
     all_keys = set(old_syms.keys()) | set(new_syms.keys())
     
@@ -155,12 +328,31 @@ def compare(old_code: str, new_code: str) -> list[SemanticChange]:
             # 2. Logic Change? (Internal Implementation)
             # Only check if signature didn't change (to avoid double reporting)
             elif old.content_hash != new.content_hash:
-                changes.append(SemanticChange("LOGIC_CHANGED", new, "Implementation changed"))
+                detail = "Implementation changed"
+                if new.type == "class" and old.shell_hash and old.shell_hash == new.shell_hash:
+                    members = _changed_members(key, old_syms, new_syms)
+                    if members:
+                        detail = f"Only members changed: {', '.join(members)}"
+                changes.append(SemanticChange("LOGIC_CHANGED", new, detail))
             
     return changes
 
-def summarize(code: str) -> str:
-    symbols = parse_code(code)
+def _changed_members(class_name: str, old_syms: dict[str, SymbolInfo], new_syms: dict[str, SymbolInfo]) -> list[str]:
+    """Short names of the members of a class that were added, removed or changed."""
+    prefix = f"{class_name}."
+    members = []
+    for key in sorted((set(old_syms) | set(new_syms))):
+        if not key.startswith(prefix):
+            continue
+        old, new = old_syms.get(key), new_syms.get(key)
+        if old is None or new is None or old.content_hash != new.content_hash:
+            members.append(key[len(prefix):])
+    return members
+
+def summarize(code: str | bytes) -> str:
+    return summarize_symbols(parse_code(code))
+
+def summarize_symbols(symbols: dict[str, SymbolInfo]) -> str:
     if not symbols: return ""
     
     lines = []
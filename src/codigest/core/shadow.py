@@ -1,57 +1,201 @@
 """
 Context Anchor Engine.
 Modified to hide internal git repository from VS Code by renaming .git -> .shadow_git
+Updates are incremental: a manifest of the last anchored file stats decides
+which files are written, deleted and staged.
+
+Anchor modes:
+  - objects:  blobs are written straight into the shadow object store
+              (hash-object -w), no worktree copy is ever materialized
+  - worktree: files are mirrored into .codigest/anchor and staged from there
 """
+import json
 import shutil
 import subprocess
 import time
+from dataclasses import dataclass
 from pathlib import Path
 from loguru import logger
 
+from .index import RACY_WINDOW_NS, ScanIndex
+from . import textdiff
+
+MANIFEST_NAME = "codigest_manifest.json"
+ANCHOR_MODES = ("objects", "worktree")
+NULL_OID = "0" * 40
+
+# rel posix path -> [size, mtime_ns]
+Manifest = dict[str, list[int]]
+# rel posix path -> (source path, [size, mtime_ns], git file mode)
+Sources = dict[str, tuple[Path, list[int], str]]
+
+@dataclass
+class FileChange:
+    """One changed file between the anchor and the current files (no content involved)."""
+    path: str                   # rel posix path (new path for renames)
+    status: str                 # ADDED | MODIFIED | DELETED | RENAMED
+    old_oid: str = ""           # anchored blob id ("" for ADDED)
+    new_oid: str = ""           # current blob id ("" for DELETED)
+    old_path: str = ""          # anchored path (differs from path only for RENAMED)
+    mode: str = "100644"
+
+class AnchorReader:
+    """
+    Streams many anchored blobs through one long-lived `git cat-file --batch` process.
+    Objects are requested by blob id or as "<rev>:<path>"; contents come back as raw bytes.
+    """
+    def __init__(self, git_dir: Path, rev: str = "HEAD"):
+        self.git_dir = git_dir
+        self.rev = rev
+        self._proc: subprocess.Popen | None = None
+
+    def __enter__(self) -> "AnchorReader":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _process(self) -> subprocess.Popen:
+        if self._proc is None:
+            self._proc = subprocess.Popen(
+                ["git", "--git-dir", str(self.git_dir), "cat-file", "--batch"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL
+            )
+        return self._proc
+
+    def read_object(self, spec: str) -> bytes | None:
+        """Content of a blob id or "<rev>:<path>" spec, None if missing."""
+        if not spec or "\n" in spec:
+            return None
+        try:
+            proc = self._process()
+            proc.stdin.write(spec.encode("utf-8") + b"\n")
+            proc.stdin.flush()
+            header = proc.stdout.readline().split()
+            # "<oid> <type> <size>" or "<spec> missing"
+            if len(header) != 3:
+                return None
+            size = int(header[2])
+            data = proc.stdout.read(size)
+            proc.stdout.read(1)  # trailing LF
+        except (OSError, ValueError) as e:
+            logger.debug(f"cat-file --batch failed for {spec}: {e}")
+            self.close()
+            return None
+        return data if header[1] == b"blob" else None
+
+    def read_bytes(self, rel_path: Path | str) -> bytes | None:
+        """Anchored content of a file (relative to the project root)."""
+        git_path = rel_path.as_posix() if isinstance(rel_path, Path) else rel_path
+        return self.read_object(f"{self.rev}:{git_path}")
+
+    def read_many(self, oids: list[str]) -> dict[str, bytes]:
+        blobs = {}
+        for oid in dict.fromkeys(oids):
+            data = self.read_object(oid)
+            if data is not None:
+                blobs[oid] = data
+        return blobs
+
+    def close(self):
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+                self._proc.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self._proc.kill()
+            self._proc = None
+
 class ContextAnchor:
-    def __init__(self, root_path: Path):
+    def __init__(self, root_path: Path, mode: str = "objects", index: ScanIndex | None = None):
         self.root = root_path
+        self.mode = mode if mode in ANCHOR_MODES else "objects"
+        # Content hashes of current files (git blob ids), cached by stat
+        self.index = index if index is not None else ScanIndex(None)
         self.anchor_dir = root_path / ".codigest" / "anchor"
 
         self.git_dir = self.anchor_dir / ".shadow_git"
+        self.manifest_path = self.git_dir / MANIFEST_NAME
 
     def has_history(self) -> bool:
         """Checks if a valid anchor (git repo with commits) exists."""
         return self.git_dir.exists() and (self.git_dir / "HEAD").exists()
 
-    def _run_git(self, args: list[str], cwd: Path | None = None, check=True) -> str:
-
-        base_cmd = [
-            "git", 
-            "--git-dir", str(self.git_dir), 
+    def _git(self, args: list[str], input: str | None = None, cwd: Path | None = None) -> subprocess.CompletedProcess:
+        cmd = [
+            "git",
+            "--git-dir", str(self.git_dir),
             "--work-tree", str(self.anchor_dir)
-        ]
-
-        cmd = base_cmd + args
+        ] + args
 
-        target_dir = cwd or self.anchor_dir
-        
-        result = subprocess.run(
-            cmd, cwd=target_dir, capture_output=True, text=True, encoding='utf-8', errors='replace'
+        return subprocess.run(
+            cmd, cwd=cwd or self.anchor_dir, input=input,
+            capture_output=True, text=True, encoding='utf-8', errors='replace'
         )
-        
+
+    def _run_git(self, args: list[str], cwd: Path | None = None, check=True, input: str | None = None) -> str:
+        result = self._git(args, input=input, cwd=cwd)
+
         if check and result.returncode != 0:
 
             logger.debug(f"Shadow Git Warning ({args[0]}): {result.stderr.strip()}")
             
         return (result.stdout or "").strip()
 
-    def update(self, source_files: list[Path]):
-        if not self.git_dir.exists():
-            self.anchor_dir.mkdir(parents=True, exist_ok=True)
-            self.git_dir.mkdir(parents=True, exist_ok=True)
+    def _head(self) -> str:
+        """Current anchor commit id ("" before the first snapshot)."""
+        result = self._git(["rev-parse", "--verify", "--quiet", "HEAD"])
+        return result.stdout.strip() if result.returncode == 0 else ""
+
+    def _init_repo(self):
+        self.anchor_dir.mkdir(parents=True, exist_ok=True)
+        self.git_dir.mkdir(parents=True, exist_ok=True)
 
-            self._run_git(["init"])
-            self._run_git(["config", "user.email", "codigest@ai"])
-            self._run_git(["config", "user.name", "Context Manager"])
-            self._run_git(["config", "core.autocrlf", "false"])
-            self._run_git(["config", "gc.auto", "0"])
+        self._run_git(["init"])
+        self._run_git(["config", "user.email", "codigest@ai"])
+        self._run_git(["config", "user.name", "Context Manager"])
+        self._run_git(["config", "core.autocrlf", "false"])
+        self._run_git(["config", "gc.auto", "0"])
 
+    def _load_manifest(self, head: str) -> Manifest | None:
+        """Stats of the anchored files, if recorded for this exact HEAD and mode."""
+        try:
+            data = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not head or data.get("head") != head or data.get("mode") != self.mode:
+            return None
+        return data.get("files", {})
+
+    def _save_manifest(self, head: str, files: Manifest):
+        data = {"head": head, "mode": self.mode, "files": files}
+        try:
+            self.manifest_path.write_text(json.dumps(data), encoding="utf-8")
+        except OSError as e:
+            logger.debug(f"Failed to write anchor manifest: {e}")
+
+    def _collect_sources(self, source_files: list[Path]) -> Sources:
+        """Stats every source file inside the root."""
+        now = time.time_ns()
+        sources = {}
+        for src in source_files:
+            if ".git" in src.parts:
+                continue
+            try:
+                rel = src.relative_to(self.root).as_posix()
+                st = src.stat()
+            except (ValueError, OSError):
+                continue
+            # Racy files (modified within the mtime tick window) are recopied next time
+            mtime_ns = st.st_mtime_ns if now - st.st_mtime_ns > RACY_WINDOW_NS else -1
+            file_mode = "100755" if st.st_mode & 0o100 else "100644"
+            sources[rel] = (src, [st.st_size, mtime_ns], file_mode)
+        return sources
+
+    def _clear_worktree(self):
         for item in self.anchor_dir.iterdir():
             if item.name == ".shadow_git": # [변경] 보호할 폴더 이름 변경
                 continue
@@ -60,115 +204,294 @@ class ContextAnchor:
             else:
                 item.unlink()
 
-        source_rel_paths = set()
+    def _remove_from_worktree(self, rel: str):
+        dest = self.anchor_dir / rel
+        try:
+            dest.unlink()
+        except FileNotFoundError:
+            pass
+        # Drop directories left empty
+        parent = dest.parent
+        while parent != self.anchor_dir:
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
 
-        for src in source_files:
-            if ".git" in src.parts:
+    def update(self, source_files: list[Path]):
+        """
+        Anchors the given files.
+        Only new/changed files are written, only removed files are dropped,
+        and only those paths are staged before the commit.
+        """
+        if not self.git_dir.exists():
+            self._init_repo()
+
+        head = self._head()
+        sources = self._collect_sources(source_files)
+        previous = self._load_manifest(head)
+
+        rebuild = previous is None
+        if rebuild:
+            # No trustworthy manifest: restage everything from an empty index
+            previous = {}
+            self._clear_worktree()
+            self._run_git(["read-tree", "--empty"])
+        elif self.mode == "objects" and any(p.name != ".shadow_git" for p in self.anchor_dir.iterdir()):
+            # Leftover mirror from worktree mode
+            self._clear_worktree()
+
+        # Racy entries (mtime recorded as -1) never match: they are restaged until they settle
+        pending = {
+            rel: item for rel, item in sources.items()
+            if previous.get(rel) != item[1] or item[1][1] == -1
+        }
+        removed = [rel for rel in previous if rel not in sources]
+
+        if self.mode == "objects":
+            staged = self._stage_objects(pending, removed)
+        else:
+            staged = self._stage_worktree(pending, removed)
+
+        manifest: Manifest = {
+            rel: stat for rel, (_, stat, _) in sources.items()
+            if rel in staged or rel not in pending
+        }
+
+        if rebuild or staged or removed:
+            new_head = self._commit_index(head)
+            if new_head != head:
+                logger.info("Context anchor updated.")
+                head = new_head
+
+        # Files that could not be staged keep their old entry (the anchored version),
+        # removed paths stay until a commit really dropped them: both are retried next time
+        for rel in pending:
+            if rel not in staged and rel in previous:
+                manifest[rel] = previous[rel]
+        for rel in self._anchored(head, removed):
+            manifest[rel] = previous[rel]
+
+        self._save_manifest(head, manifest)
+
+    def _anchored(self, head: str, rels: list[str]) -> set[str]:
+        """The given paths that are still in the anchored tree (all of them if git fails)."""
+        present: set[str] = set()
+        if not head:
+            return present
+        for start in range(0, len(rels), 256):
+            chunk = rels[start:start + 256]
+            result = self._git(["--literal-pathspecs", "ls-tree", "-r", "-z", "--name-only", "--full-tree", head, "--", *chunk])
+            if result.returncode != 0:
+                logger.debug(f"Shadow Git Warning (ls-tree): {result.stderr.strip()}")
+                present.update(chunk)
                 continue
+            present.update(rel for rel in result.stdout.split("\0") if rel)
+        return present
+
+    def _stage_worktree(self, pending: Sources, removed: list[str]) -> set[str]:
+        """Mirrors changes into the anchor worktree and stages exactly those paths."""
+        copied = set()
+        for rel, (src, _, _) in pending.items():
             try:
-                rel = src.relative_to(self.root)
                 dest = self.anchor_dir / rel
-
-                if not dest.parent.exists():
-                    dest.parent.mkdir(parents=True, exist_ok=True)
-
-                should_copy = True
-                if dest.exists():
-                    src_stat = src.stat()
-                    dest_stat = dest.stat()
-
-                    if src_stat.st_size == dest_stat.st_size and dest_stat.st_mtime >= src_stat.st_mtime:
-                        should_copy = False
-                
-                if should_copy:
-                    shutil.copy2(src, dest)
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(src, dest)
             except Exception:
                 continue
+            copied.add(rel)
+
+        for rel in removed:
+            self._remove_from_worktree(rel)
+
+        # Explicit paths: update-index neither applies copied .gitignore files nor touches .shadow_git
+        to_stage = sorted(copied) + removed
+        if to_stage:
+            paths = "\0".join(to_stage) + "\0"
+            self._run_git(["update-index", "--add", "--remove", "-z", "--stdin"], input=paths)
+        return copied
+
+    def _stage_objects(self, pending: Sources, removed: list[str]) -> set[str]:
+        """
+        Writes changed blobs straight into the object store and points the index at them.
+        Files that cannot be hashed are left out; removals are always staged.
+        """
+        oids = self._hash_objects(pending)
+        entries = [f"{pending[rel][2]} {oid}\t{rel}" for rel, oid in oids.items()]
+        entries += [f"0 {NULL_OID}\t{rel}" for rel in removed]
+        if entries:
+            self._run_git(["update-index", "-z", "--index-info"], input="\0".join(entries) + "\0")
+        return set(oids)
+
+    def _hash_objects(self, pending: Sources) -> dict[str, str]:
+        """
+        rel -> blob id of each pending file, written with hash-object -w.
+        One process for all blobs; if that fails (a file vanished or is unreadable),
+        one process per file, so only the failing files are skipped.
+        """
+        # --stdin-paths is newline-separated: such paths always go one by one
+        batch = [rel for rel in pending if "\n" not in str(pending[rel][0])]
+        single = [rel for rel in pending if "\n" in str(pending[rel][0])]
+        oids: dict[str, str] = {}
+        if batch:
+            paths = "".join(f"{pending[rel][0]}\n" for rel in batch)
+            result = self._git(["hash-object", "-w", "--no-filters", "--stdin-paths"], input=paths)
+            hashed = result.stdout.split()
+            if result.returncode == 0 and len(hashed) == len(batch):
+                oids.update(zip(batch, hashed))
+            else:
+                logger.debug(f"Shadow Git Warning (hash-object): {result.stderr.strip()}")
+                single = batch + single
+
+        for rel in single:
+            result = self._git(["hash-object", "-w", "--no-filters", "--", str(pending[rel][0])])
+            oid = result.stdout.strip()
+            if result.returncode == 0 and oid:
+                oids[rel] = oid
+            else:
+                logger.debug(f"Shadow Git Warning (hash-object {rel}): {result.stderr.strip()}")
+        return oids
+
+    def _commit_index(self, head: str) -> str:
+        """Commits the index via write-tree/commit-tree if its tree differs from HEAD."""
+        tree = self._run_git(["write-tree"])
+        if not tree:
+            return head
+        if head and self._run_git(["rev-parse", f"{head}^{{tree}}"]) == tree:
+            return head
+
+        args = ["commit-tree", tree, "-m", f"Snapshot: {int(time.time())}"]
+        if head:
+            args += ["-p", head]
+        commit = self._run_git(args)
+        if not commit:
+            return head
+        self._run_git(["update-ref", "HEAD", commit])
+        return commit
+
+    def _tree_entries(self, head: str) -> dict[str, tuple[str, str]]:
+        """rel posix path -> (mode, blob id) for every file in the anchored tree."""
+        if not head:
+            return {}
+        result = self._git(["ls-tree", "-r", "-z", "--full-tree", head])
+        entries = {}
+        for record in result.stdout.split("\0"):
+            if not record:
+                continue
+            info, _, rel = record.partition("\t")
+            mode, obj_type, oid = info.split(" ")
+            if obj_type == "blob":
+                entries[rel] = (mode, oid)
+        return entries
+
+    def _current_oids(self, current_files: list[Path], head: str, tree: dict[str, tuple[str, str]]) -> dict[str, tuple[Path, str]]:
+        """
+        rel posix path -> (path, blob id) of the current files.
+        Files whose stat still matches the manifest reuse the anchored blob id;
+        the rest are hashed through the scan index (cached by stat).
+        """
+        manifest = self._load_manifest(head) or {}
+        current = {}
+        for src in current_files:
+            if ".git" in src.parts:
+                continue
+            try:
+                rel = src.relative_to(self.root).as_posix()
+                record = self.index.stat(src)
+                recorded = manifest.get(rel)
+                if recorded == [record.size, record.mtime_ns] and rel in tree:
+                    current[rel] = (src, tree[rel][1])
+                else:
+                    current[rel] = (src, self.index.content_hash(src))
+            except (ValueError, OSError):
+                continue
+        return current
+
+    def open_reader(self, rev: str = "HEAD") -> AnchorReader:
+        """Bulk reader for anchored content (use as a context manager)."""
+        return AnchorReader(self.git_dir, rev)
+
+    def get_file_changes(self, current_files: list[Path]) -> list[FileChange]:
+        """
+        Structured change list between the anchor and the current files,
+        computed from blob ids only (anchored tree vs. stat-cached hashes).
+        Exact renames (a deleted blob id reappearing under a new path) are paired up.
+        """
+        if not self.git_dir.exists():
+            return []
+
+        head = self._head()
+        tree = self._tree_entries(head)
+        current = self._current_oids(current_files, head, tree)
+
+        changes: list[FileChange] = []
+        added: list[str] = []
+        for rel, (_, oid) in current.items():
+            old = tree.get(rel)
+            if old is None:
+                added.append(rel)
+            elif old[1] != oid:
+                changes.append(FileChange(rel, "MODIFIED", old[1], oid, rel, old[0]))
+        # Anchored files outside the current selection only count as deleted
+        # if they are really gone (not merely filtered out of this scan)
+        deleted = [rel for rel in tree if rel not in current and not (self.root / rel).exists()]
+
+        gone_by_oid: dict[str, list[str]] = {}
+        for rel in sorted(deleted):
+            gone_by_oid.setdefault(tree[rel][1], []).append(rel)
+
+        for rel in sorted(added):
+            oid = current[rel][1]
+            candidates = gone_by_oid.get(oid)
+            if candidates:
+                old_rel = candidates.pop(0)
+                changes.append(FileChange(rel, "RENAMED", oid, oid, old_rel, tree[old_rel][0]))
+            else:
+                changes.append(FileChange(rel, "ADDED", "", oid))
 
-        for anchor_file in self.anchor_dir.rglob("*"):
-            if anchor_file.is_file():
-                if ".git" in anchor_file.parts:
-                    continue
-
-                try:
-                    rel = anchor_file.relative_to(self.anchor_dir)
-                    if rel not in source_rel_paths:
-                        anchor_file.unlink()
-
-                except Exception:
-                    continue
+        for rel_list in gone_by_oid.values():
+            for rel in rel_list:
+                mode, oid = tree[rel]
+                changes.append(FileChange(rel, "DELETED", oid, "", rel, mode))
 
-        self._run_git(["add", "."])
-        if self._run_git(["diff-index", "--quiet", "HEAD", "--"], check=False) != "":
-            self._run_git(["commit", "-m", f"Snapshot: {int(time.time())}"])
-            logger.info("Context anchor updated.")
+        self.index.save()
+        return sorted(changes, key=lambda c: c.path)
 
     def get_changes(self, current_files: list[Path]) -> str:
-        if not self.git_dir.exists():
+        """
+        Unified diff (no prefix) between the anchor and the current files.
+        Only files reported by get_file_changes are read and diffed; baseline
+        content comes from one cat-file --batch call.
+        """
+        changes = self.get_file_changes(current_files)
+        if not changes:
             return ""
 
-        temp_current = self.root / ".codigest" / "temp_diff_current"
-        temp_baseline = self.root / ".codigest" / "temp_diff_baseline"
-        
-        for d in [temp_current, temp_baseline]:
-            if d.exists():
-                shutil.rmtree(d)
-            d.mkdir(parents=True)
+        with self.open_reader() as reader:
+            baseline = reader.read_many([c.old_oid for c in changes if c.status in ("MODIFIED", "DELETED")])
 
-        try:
-            current_rel_paths = set()
-            for src in current_files:
-                if ".git" in src.parts:
+        sections = []
+        for change in changes:
+            if change.status == "RENAMED":
+                sections.append(textdiff.rename_header(change.old_path, change.path))
+                continue
+
+            old = None
+            if change.old_oid:
+                old = baseline.get(change.old_oid)
+                if old is None:
+                    # Baseline blob unreadable; do not report the file as new
                     continue
+            new = None
+            if change.new_oid:
                 try:
-                    rel = src.relative_to(self.root)
-                    current_rel_paths.add(rel)
-                    dest = temp_current / rel
-                    dest.parent.mkdir(parents=True, exist_ok=True)
-                    shutil.copy2(src, dest)
-                except Exception:
+                    new = (self.root / change.path).read_bytes()
+                except OSError:
                     continue
+            sections.append(textdiff.unified_diff(change.path, old, new, change.old_oid, change.new_oid, change.mode))
 
-            subprocess.run(
-                [
-                    "git", 
-                    "--git-dir", str(self.git_dir),  # [변경] .shadow_git 경로 사용
-                    "--work-tree", str(temp_baseline), 
-                    "checkout", "HEAD", "--", "."
-                ],
-                capture_output=True, check=False
-            )
-
-            self._prune_ignored_files(temp_baseline, current_rel_paths)
-
-            result = subprocess.run(
-                ["git", "diff", "--no-index", "--no-prefix", "temp_diff_baseline", "temp_diff_current"],
-                cwd=self.root / ".codigest",
-                capture_output=True, text=True, encoding='utf-8', errors='replace'
-            )
-            
-            diff_text = (result.stdout or "")
-            diff_text = diff_text.replace("temp_diff_baseline/", "").replace("temp_diff_current/", "")
-            return diff_text
-
-        finally:
-            for d in [temp_current, temp_baseline]:
-                if d.exists():
-                    shutil.rmtree(d)
-
-    def _prune_ignored_files(self, baseline_dir: Path, valid_rel_paths: set[Path]):
-        for file_path in baseline_dir.rglob("*"):
-            if file_path.is_file() and ".git" not in file_path.parts:
-                try:
-                    rel_path = file_path.relative_to(baseline_dir)
-                    if rel_path in valid_rel_paths:
-                        continue
-                    
-                    real_file = self.root / rel_path
-                    if real_file.exists():
-                        file_path.unlink()
-                except Exception:
-                    continue
+        return "".join(sections)
 
     def get_last_update_time(self) -> str:
         if not self.git_dir.exists():
@@ -180,34 +503,17 @@ class ContextAnchor:
             return "Unknown"
 
     def read_anchor_file(self, rel_path: Path) -> str:
+        """Single anchored file as text. Use open_reader() for many files."""
         if not self.git_dir.exists():
             return ""
-        
-        git_path = rel_path.as_posix()
-
-        result = subprocess.run(
-            [
-                "git", 
-                "--git-dir", str(self.git_dir), # [변경]
-                "--work-tree", str(self.anchor_dir),
-                "show", f"HEAD:{git_path}"
-            ],
-            capture_output=True, text=True, encoding='utf-8', errors='replace'
-        )
-        
-        if result.returncode != 0:
+
+        with self.open_reader() as reader:
+            data = reader.read_bytes(rel_path)
+
+        if data is None:
             return ""
-            
-        return result.stdout
+        return data.decode("utf-8", errors="replace")
 
     def get_changed_files(self, current_files: list[Path]) -> list[Path]:
-        raw_diff = self.get_changes(current_files)
-        paths = set()
-        for line in raw_diff.splitlines():
-            if line.startswith("diff --git"):
-                parts = line.split()
-                if len(parts) >= 4:
-                    p = parts[-1]
-                    if p.startswith("b/") or p.startswith("a/"): p = p[2:]
-                    paths.add(self.root / p)
-        return sorted(list(paths))
+        """Paths of every changed file (current path for renames)."""
+        return [self.root / change.path for change in self.get_file_changes(current_files)]
@@ -0,0 +1,550 @@
+"""
+Streaming Snapshot Writer.
+Writes the rendered template head, streamed fields (tree lines, file blocks)
+and tail straight to disk, counting bytes and tokens on the fly.
+Peak memory is bounded by the largest single file block.
+Oversized contexts can be split into numbered shards (snapshot.001.xml, ...)
+with a JSON manifest, still written as a stream.
+"""
+import json
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+from loguru import logger
+
+from . import processor, prompts, tags, tokenizer
+
+@dataclass
+class SnapshotStats:
+    files: int = 0
+    bytes: int = 0
+    tokens: int = 0
+
+
+def joined(chunks: Iterable[str], separator: str) -> Iterator[str]:
+    """Streaming equivalent of separator.join(chunks)."""
+    first = True
+    for chunk in chunks:
+        yield chunk if first else separator + chunk
+        first = False
+
+
+def display_path(file_path: Path, root_path: Path) -> str:
+    try:
+        return file_path.relative_to(root_path).as_posix()
+    except ValueError:
+        return f"[EXTERNAL]/{file_path.name}"
+
+
+def render_block(rel_path: str, content: str, line_numbers: bool) -> str:
+    """CPU part of a block (numbering + escaping). Top-level so process pools can pickle it."""
+    if line_numbers:
+        content = processor.number_lines(content)
+    return tags.file(rel_path, content)
+
+
+class BlockLoader:
+    """
+    Concurrent content-loading stage.
+    Reads run on a thread pool (I/O releases the GIL); files above
+    process_threshold are numbered/escaped on an optional process pool.
+    Blocks are yielded in input order with a bounded read-ahead window.
+    """
+    def __init__(
+            self,
+            root_path: Path,
+            line_numbers: bool = False,
+            workers: int = 1,
+            process_workers: int = 0,
+            process_threshold: int = 512 * 1024,
+            policy: Optional[processor.SizePolicy] = None,
+            kinds: Optional[dict[Path, str]] = None
+            ):
+        self.root_path = root_path
+        # Large-file policy: reads stay bounded by max_file_size_kb
+        self.policy = policy
+        # Sniffed content kinds (scan index); known binaries are never opened
+        self.kinds = kinds or {}
+        self.line_numbers = line_numbers
+        self.workers = max(1, workers)
+        self.process_workers = max(0, process_workers)
+        self.process_threshold = process_threshold
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+
+    def load(self, file_path: Path) -> Optional[str]:
+        """One <file> block, read inline (None if the file cannot be loaded)."""
+        rel_path = display_path(file_path, self.root_path)
+        try:
+            content, ok = processor.read_text(file_path, self.policy, self.kinds.get(file_path))
+            if not ok:
+                return tags.file(rel_path, content)
+            if self._process_pool is not None and len(content) >= self.process_threshold:
+                return self._process_pool.submit(render_block, rel_path, content, self.line_numbers).result()
+            return render_block(rel_path, content, self.line_numbers)
+        except Exception:
+            return None
+
+    def iter_blocks(self, files: list[Path]) -> Iterator[str]:
+        if self.workers == 1 and self.process_workers == 0:
+            for file_path in files:
+                block = self.load(file_path)
+                if block is not None:
+                    yield block
+            return
+
+        if self.process_workers:
+            self._process_pool = ProcessPoolExecutor(max_workers=self.process_workers)
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                # Read-ahead window keeps memory bounded to a few blocks per worker
+                window = self.workers * 4
+                pending: deque[Future] = deque()
+                remaining = iter(files)
+                for file_path in islice(remaining, window):
+                    pending.append(executor.submit(self.load, file_path))
+
+                while pending:
+                    block = pending.popleft().result()
+                    next_path = next(remaining, None)
+                    if next_path is not None:
+                        pending.append(executor.submit(self.load, next_path))
+                    if block is not None:
+                        yield block
+        finally:
+            if self._process_pool is not None:
+                self._process_pool.shutdown(cancel_futures=True)
+                self._process_pool = None
+
+
+def iter_file_blocks(
+    files: list[Path],
+    root_path: Path,
+    line_numbers: bool = False,
+    workers: int = 1,
+    process_workers: int = 0,
+    policy: Optional[processor.SizePolicy] = None,
+    kinds: Optional[dict[Path, str]] = None
+) -> Iterator[str]:
+    """Reads and escapes files, yielding <file> blocks in input order."""
+    loader = BlockLoader(root_path, line_numbers, workers, process_workers, policy=policy, kinds=kinds)
+    return loader.iter_blocks(files)
+
+
+class SnapshotWriter:
+    """
+    Usage:
+        with SnapshotWriter(path) as writer:
+            writer.write_template(template, {"source_code": blocks})
+    Output goes to a temporary file that replaces `path` only on success
+    (or on commit(), with defer=True, so several files can be swapped in together).
+    """
+    def __init__(self, output_path: Path, token_backend=None, defer: bool = False):
+        """token_backend: counts the written text (None = chars/4 estimate)."""
+        self.output_path = output_path
+        self.defer = defer
+        self.stats = SnapshotStats()
+        self._tmp_path = output_path.with_name(output_path.name + ".tmp")
+        self._handle = None
+        self._counter = tokenizer.TokenCounter(token_backend)
+
+    def __enter__(self) -> "SnapshotWriter":
+        self._handle = open(self._tmp_path, "w", encoding="utf-8")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._handle.close()
+        if exc_type is None:
+            self.stats.bytes = self._tmp_path.stat().st_size
+            self.stats.tokens = self._counter.total
+            if not self.defer:
+                self.commit()
+        else:
+            self.discard()
+        return False
+
+    def commit(self):
+        os.replace(self._tmp_path, self.output_path)
+
+    def discard(self):
+        self._tmp_path.unlink(missing_ok=True)
+
+    def write(self, text: str, tokens: Optional[int] = None):
+        """tokens: count already made with this writer's backend (skips a second count)."""
+        self._handle.write(text)
+        if tokens is None:
+            self._counter.add(text)
+        else:
+            self._counter.add_count(tokens)
+
+    def write_template(self, template: prompts.StreamTemplate, streams: dict[str, Iterable[str]]):
+        """Writes template parts, filling each streamed field from its iterable."""
+        for i, part in enumerate(template.parts):
+            self.write(part)
+            if i >= len(template.fields):
+                break
+            for chunk in streams.get(template.fields[i], ()):
+                self.write(template.transform(chunk))
+
+
+def write_snapshot(
+    output_path: Path,
+    template: prompts.StreamTemplate,
+    tree_lines: Iterable[str],
+    file_blocks: Iterable[str],
+    token_backend=None
+) -> SnapshotStats:
+    """
+    Streams a full snapshot (tree + file blocks) into output_path.
+    Shards and the manifest of an earlier sharded run are removed.
+    """
+    with SnapshotWriter(output_path, token_backend) as writer:
+        def _counted(blocks: Iterable[str]) -> Iterator[str]:
+            for block in blocks:
+                writer.stats.files += 1
+                yield block
+
+        writer.write_template(template, {
+            "tree_structure": joined(tree_lines, "\n"),
+            "source_code": joined(_counted(file_blocks), "\n\n"),
+        })
+    remove_shards(output_path)
+    return writer.stats
+
+
+# --- Sharded output -------------------------------------------------------------
+
+BLOCK_SEPARATOR = "\n\n"
+CONTINUED_TO = "<<Continued in next shard>>"
+CONTINUED_FROM = "<<Continued from previous shard>>"
+
+
+@dataclass
+class ShardInfo:
+    path: str                   # File name next to the snapshot (snapshot.001.xml)
+    files: list[str]            # Block labels in order ("a.py", "big.py (PART 1/2)")
+    tokens: int = 0
+    bytes: int = 0
+    oversized: list[str] = field(default_factory=list)  # Blocks alone over the limit (shard exceeds it)
+
+
+@dataclass
+class ShardedStats(SnapshotStats):
+    shards: list[ShardInfo] = field(default_factory=list)
+    manifest: Optional[Path] = None
+
+
+def shard_path(output_path: Path, number: int) -> Path:
+    """snapshot.xml -> snapshot.001.xml"""
+    return output_path.with_name(f"{output_path.stem}.{number:03d}{output_path.suffix}")
+
+
+def manifest_path(output_path: Path) -> Path:
+    """snapshot.xml -> snapshot.manifest.json"""
+    return output_path.with_name(f"{output_path.stem}.manifest.json")
+
+
+def remove_shards(output_path: Path, start: int = 1):
+    """Removes the manifest and the numbered shards from `start` on (if any)."""
+    if start == 1:
+        manifest_path(output_path).unlink(missing_ok=True)
+    number = start
+    while (path := shard_path(output_path, number)).exists():
+        path.unlink(missing_ok=True)
+        number += 1
+
+
+def _block_label(block: str) -> str:
+    """The path attribute of a <file> block ("src/a.py (PART 1/2)")."""
+    header = block.split("\n", 1)[0]
+    start = header.find('path="')
+    if start == -1:
+        return header
+    return header[start + 6:header.rfind('"')]
+
+
+class ShardedSnapshotWriter:
+    """
+    Streams a snapshot into numbered shards, each within max_tokens and/or max_bytes.
+    Every shard is a complete rendering of the template; the tree goes into
+    the first one, later shards point back to it. Splits fall between <file>
+    blocks; a block too large for an empty shard is cut at line boundaries into
+    "(PART i/n)" blocks with continuation markers. Blocks that still exceed the
+    limit (no line breaks to cut at, or a single overlong line) are written
+    whole, with a warning, and listed as "oversized" in the manifest.
+    Only the current shard's block is held in memory. Shards are written to
+    temporary files and swapped in together with the manifest at the end, so a
+    failed run leaves the previous output untouched. A manifest lists each
+    shard's files and counts.
+    """
+    def __init__(
+            self,
+            output_path: Path,
+            template: prompts.StreamTemplate,
+            token_backend=None,
+            max_tokens: int = 0,
+            max_bytes: int = 0
+            ):
+        self.output_path = output_path
+        self.template = template
+        # Blocks are measured before they are written, so a real backend is always used
+        self.backend = token_backend or tokenizer.EstimateBackend()
+        self.max_tokens = max(0, max_tokens)
+        self.max_bytes = max(0, max_bytes)
+        self.stats = ShardedStats()
+
+        source_index = template.fields.index("source_code")
+        self._head_parts = template.parts[:source_index + 1]
+        self._head_fields = template.fields[:source_index]
+        self._tail_parts = template.parts[source_index + 1:]
+        self._tail_fields = template.fields[source_index + 1:]
+        self._separator = self._measure(template.transform(BLOCK_SEPARATOR))
+
+        self._writer: Optional[SnapshotWriter] = None
+        self._done: list[SnapshotWriter] = []  # Closed shards waiting for commit
+        self._shard: Optional[ShardInfo] = None
+        self._used = (0, 0)
+        self._reserve = (0, 0)
+        self._empty = (0, 0)
+
+    # --- Measuring --------------------------------------------------------------
+
+    def _measure(self, text: str) -> tuple[int, int]:
+        size = len(text.encode("utf-8"))
+        if os.linesep != "\n":
+            size += text.count("\n") * (len(os.linesep) - 1)
+        return self.backend.count(text), size
+
+    def _fits(self, cost: tuple[int, int]) -> bool:
+        tokens = self._used[0] + cost[0] + self._reserve[0]
+        size = self._used[1] + cost[1] + self._reserve[1]
+        return (not self.max_tokens or tokens <= self.max_tokens) and (not self.max_bytes or size <= self.max_bytes)
+
+    def _room(self) -> tuple[int, int]:
+        """Budget left in the current shard (0 = unlimited on that axis)."""
+        tokens = self.max_tokens - self._used[0] - self._reserve[0] if self.max_tokens else 0
+        size = self.max_bytes - self._used[1] - self._reserve[1] if self.max_bytes else 0
+        return tokens, size
+
+    # --- Shards -----------------------------------------------------------------
+
+    def _write(self, text: str, cost: Optional[tuple[int, int]] = None):
+        cost = cost or self._measure(text)
+        self._writer.write(text, cost[0])
+        self._used = (self._used[0] + cost[0], self._used[1] + cost[1])
+
+    def _field_chunks(self, name: str, tree_lines: Optional[Iterable[str]]) -> Iterable[str]:
+        if name != "tree_structure":
+            return ()
+        if tree_lines is not None:
+            return joined(tree_lines, "\n")
+        return (f"(see {shard_path(self.output_path, 1).name})",)
+
+    def _open(self, tree_lines: Optional[Iterable[str]] = None):
+        number = len(self.stats.shards) + 1
+        path = shard_path(self.output_path, number)
+        self._writer = SnapshotWriter(path, self.backend, defer=True).__enter__()
+        self._shard = ShardInfo(path=path.name, files=[])
+        self._used = (0, 0)
+
+        for i, part in enumerate(self._head_parts):
+            self._write(part)
+            if i < len(self._head_fields):
+                for chunk in self._field_chunks(self._head_fields[i], tree_lines):
+                    self._write(self.template.transform(chunk))
+
+        # The tail is written last but must fit too
+        tail = "".join(self._tail_parts)
+        tail += "".join(
+            self.template.transform(chunk)
+            for name in self._tail_fields
+            for chunk in self._field_chunks(name, None)
+        )
+        self._reserve = self._measure(tail)
+
+    def _close(self, failed: bool = False):
+        if self._writer is None:
+            return
+        writer, self._writer = self._writer, None
+        if failed:
+            writer.__exit__(RuntimeError, None, None)
+            return
+        for i, part in enumerate(self._tail_parts):
+            writer.write(part)
+            if i < len(self._tail_fields):
+                for chunk in self._field_chunks(self._tail_fields[i], None):
+                    writer.write(self.template.transform(chunk))
+        writer.__exit__(None, None, None)
+        self._done.append(writer)
+        self._shard.tokens = writer.stats.tokens
+        self._shard.bytes = writer.stats.bytes
+        self.stats.shards.append(self._shard)
+
+    def _add_block(self, block: str, cost: tuple[int, int]):
+        if self._shard.files:
+            if not self._fits((cost[0] + self._separator[0], cost[1] + self._separator[1])):
+                self._close()
+                self._open()
+            else:
+                self._write(self.template.transform(BLOCK_SEPARATOR), self._separator)
+        self._write(self.template.transform(block), cost)
+        label = _block_label(block)
+        self._shard.files.append(label)
+        if self._oversized(cost):
+            logger.warning(f"{label} is larger than a shard and cannot be split further; {self._shard.path} exceeds the limit.")
+            self._shard.oversized.append(label)
+
+    def _oversized(self, cost: tuple[int, int]) -> bool:
+        """Too big for even an empty shard."""
+        room = self._empty
+        return bool((room[0] and cost[0] > room[0]) or (room[1] and cost[1] > room[1]))
+
+    # --- Splitting --------------------------------------------------------------
+
+    def _split(self, block: str) -> list[tuple[str, tuple[int, int]]]:
+        """
+        Cuts an oversized block into parts: the first one fills what is left of
+        the current shard (if that is a useful amount), the others each fit an
+        empty shard. A single line longer than that still becomes its own part.
+        """
+        header, rest = block.split("\n", 1)
+        body_lines = rest[:-len("\n</file>")].split("\n") if rest.endswith("\n</file>") else rest.split("\n")
+        marker_to = tags.escape_xml_value(CONTINUED_TO)
+        marker_from = tags.escape_xml_value(CONTINUED_FROM)
+
+        # Room of an empty (non-first) shard, minus the wrapper and both markers
+        room_tokens, room_bytes = self._empty_room()
+        overhead = self._measure(self.template.transform(f"{header} (PART 00/00)\n{marker_from}\n{marker_to}\n</file>"))
+        room_tokens = max(room_tokens - overhead[0], 1) if room_tokens else 0
+        room_bytes = max(room_bytes - overhead[1], 1) if room_bytes else 0
+
+        # Left in the current shard (after the separator); a sliver is not worth a part
+        left_tokens, left_bytes = self._room()
+        if self._shard.files:
+            left_tokens -= self._separator[0]
+            left_bytes -= self._separator[1]
+        left_tokens = left_tokens - overhead[0] if room_tokens else 0
+        left_bytes = left_bytes - overhead[1] if room_bytes else 0
+        if (room_tokens and left_tokens < room_tokens // 4) or (room_bytes and left_bytes < room_bytes // 4):
+            limit = (room_tokens, room_bytes)
+        else:
+            limit = (left_tokens, left_bytes)
+
+        chunks: list[list[str]] = [[]]
+        used = (0, 0)
+        for line in body_lines:
+            cost = self._measure(self.template.transform(line + "\n"))
+            over = (limit[0] and used[0] + cost[0] > limit[0]) or (limit[1] and used[1] + cost[1] > limit[1])
+            if over and chunks[-1]:
+                chunks.append([])
+                used = (0, 0)
+                limit = (room_tokens, room_bytes)
+            chunks[-1].append(line)
+            used = (used[0] + cost[0], used[1] + cost[1])
+
+        total = len(chunks)
+        if total == 1:
+            # One overlong line: nothing to cut at
+            return [(block, self._measure(self.template.transform(block)))]
+        parts = []
+        for i, lines in enumerate(chunks, 1):
+            body = list(lines)
+            if i > 1:
+                body.insert(0, marker_from)
+            if i < total:
+                body.append(marker_to)
+            # header is '<file path="...">': the part number goes into the path attribute
+            part_header = f'{header[:-2]} (PART {i}/{total})">'
+            part = f"{part_header}\n" + "\n".join(body) + "\n</file>"
+            parts.append((part, self._measure(self.template.transform(part))))
+        return parts
+
+    def _empty_room(self) -> tuple[int, int]:
+        """Room in a fresh non-first shard (head with the tree pointer, tail reserved)."""
+        head = ""
+        for i, part in enumerate(self._head_parts):
+            head += part
+            if i < len(self._head_fields):
+                head += "".join(self.template.transform(c) for c in self._field_chunks(self._head_fields[i], None))
+        head_cost = self._measure(head)
+        tokens = self.max_tokens - head_cost[0] - self._reserve[0] if self.max_tokens else 0
+        size = self.max_bytes - head_cost[1] - self._reserve[1] if self.max_bytes else 0
+        return max(tokens, 1) if self.max_tokens else 0, max(size, 1) if self.max_bytes else 0
+
+    # --- Entry point ------------------------------------------------------------
+
+    def write(self, tree_lines: Iterable[str], file_blocks: Iterable[str]) -> ShardedStats:
+        self._open(tree_lines)
+        self._empty = self._empty_room()
+        try:
+            for block in file_blocks:
+                self.stats.files += 1
+                cost = self._measure(self.template.transform(block))
+                if self._oversized(cost) and block.startswith("<file ") and block.count("\n") > 1:
+                    for part, part_cost in self._split(block):
+                        self._add_block(part, part_cost)
+                else:
+                    self._add_block(block, cost)
+            self._close()
+            self.stats.tokens = sum(s.tokens for s in self.stats.shards)
+            self.stats.bytes = sum(s.bytes for s in self.stats.shards)
+            manifest_tmp = self._write_manifest()
+        except BaseException:
+            self._close(failed=True)
+            for writer in self._done:
+                writer.discard()
+            raise
+
+        self._commit(manifest_tmp)
+        return self.stats
+
+    def _write_manifest(self):
+        path = manifest_path(self.output_path)
+        manifest = {
+            "snapshot": self.output_path.name,
+            "max_tokens": self.max_tokens or None,
+            "max_bytes": self.max_bytes or None,
+            "tokenizer": self.backend.name,
+            "files": self.stats.files,
+            "tokens": self.stats.tokens,
+            "bytes": self.stats.bytes,
+            "shards": [
+                {"path": s.path, "tokens": s.tokens, "bytes": s.bytes, "files": s.files, "oversized": s.oversized}
+                for s in self.stats.shards
+            ],
+        }
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8")
+        return tmp_path
+
+    def _commit(self, manifest_tmp: Path):
+        """
+        Swaps the new shards in. The old manifest goes first and the new one last,
+        so a manifest on disk always describes the shards next to it.
+        Leftovers of the other output form (or of a longer run) are removed.
+        """
+        path = manifest_path(self.output_path)
+        path.unlink(missing_ok=True)
+        for writer in self._done:
+            writer.commit()
+        os.replace(manifest_tmp, path)
+        self.stats.manifest = path
+        remove_shards(self.output_path, start=len(self.stats.shards) + 1)
+        self.output_path.unlink(missing_ok=True)
+
+
+def write_sharded_snapshot(
+    output_path: Path,
+    template: prompts.StreamTemplate,
+    tree_lines: Iterable[str],
+    file_blocks: Iterable[str],
+    token_backend=None,
+    max_tokens: int = 0,
+    max_bytes: int = 0
+) -> ShardedStats:
+    """Streams a snapshot into shard files next to output_path plus a manifest."""
+    writer = ShardedSnapshotWriter(output_path, template, token_backend, max_tokens, max_bytes)
+    return writer.write(tree_lines, file_blocks)
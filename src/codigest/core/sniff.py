@@ -0,0 +1,96 @@
+"""
+Content Classification.
+Decides text vs binary from the first few KB of a file, so binaries are
+never read (or decoded) in full:
+  - magic numbers of common asset/archive/executable formats
+  - BOMs (UTF-8 is text; UTF-16/32 are not readable as UTF-8)
+  - NUL bytes (git's heuristic)
+  - invalid UTF-8 within the sniffed prefix
+The verdict is a short label ("text" or a type name) that the scan index caches.
+"""
+import codecs
+from pathlib import Path
+
+SNIFF_BYTES = 8192
+TEXT = "text"
+
+# (prefix, label); checked in order
+MAGIC_NUMBERS: list[tuple[bytes, str]] = [
+    (b"\x89PNG\r\n\x1a\n", "PNG image"),
+    (b"\xff\xd8\xff", "JPEG image"),
+    (b"GIF87a", "GIF image"),
+    (b"GIF89a", "GIF image"),
+    (b"%PDF-", "PDF document"),
+    (b"PK\x03\x04", "ZIP archive"),
+    (b"PK\x05\x06", "ZIP archive"),
+    (b"\x1f\x8b", "gzip archive"),
+    (b"BZh", "bzip2 archive"),
+    (b"\xfd7zXZ\x00", "xz archive"),
+    (b"7z\xbc\xaf\x27\x1c", "7z archive"),
+    (b"\x7fELF", "ELF executable"),
+    (b"MZ", "Windows executable"),
+    (b"\xca\xfe\xba\xbe", "Java class / Mach-O"),
+    (b"\xcf\xfa\xed\xfe", "Mach-O executable"),
+    (b"\x00asm", "WebAssembly module"),
+    (b"SQLite format 3\x00", "SQLite database"),
+    (b"\x00\x00\x01\x00", "ICO image"),
+    (b"OggS", "Ogg media"),
+    (b"fLaC", "FLAC audio"),
+    (b"ID3", "MP3 audio"),
+    (b"wOFF", "WOFF font"),
+    (b"wOF2", "WOFF2 font"),
+]
+
+# UTF-32 first: its LE BOM starts with the UTF-16 LE BOM
+BOMS: list[tuple[bytes, str]] = [
+    (codecs.BOM_UTF32_LE, "UTF-32 text"),
+    (codecs.BOM_UTF32_BE, "UTF-32 text"),
+    (codecs.BOM_UTF16_LE, "UTF-16 text"),
+    (codecs.BOM_UTF16_BE, "UTF-16 text"),
+]
+
+
+def _reads_as_text(head: bytes, whole: bool) -> bool:
+    if b"\0" in head:
+        return False
+    try:
+        # Unless this is the whole file, a character cut at the end is not an error
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=whole)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def _printable(prefix: bytes) -> bool:
+    return prefix.isascii() and prefix.decode("ascii").isprintable()
+
+
+def classify(head: bytes, whole: bool = False) -> str:
+    """
+    Label for a file whose first bytes are `head` ("text" if it reads as UTF-8).
+    whole=True means `head` is the entire file.
+    """
+    if head.startswith(codecs.BOM_UTF8):
+        return TEXT
+    for prefix, label in BOMS:
+        if head.startswith(prefix):
+            return label
+
+    textual = _reads_as_text(head, whole)
+    for prefix, label in MAGIC_NUMBERS:
+        # Printable signatures ("MZ", "ID3", ...) can start a text file too
+        if head.startswith(prefix) and not (textual and _printable(prefix)):
+            return label
+    # RIFF containers carry their type at offset 8
+    if head.startswith(b"RIFF") and len(head) >= 12 and not textual:
+        return {b"WEBP": "WebP image", b"WAVE": "WAV audio", b"AVI ": "AVI video"}.get(head[8:12], "RIFF data")
+
+    if textual:
+        return TEXT
+    return "binary" if b"\0" in head else "non-UTF-8 data"
+
+
+def classify_file(path: Path) -> str:
+    with open(path, "rb") as f:
+        head = f.read(SNIFF_BYTES)
+        return classify(head, whole=len(head) < SNIFF_BYTES)
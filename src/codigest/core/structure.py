@@ -1,48 +1,64 @@
 from pathlib import Path
+from typing import Iterator, Optional
 
 def generate_toon(paths: list[Path], root_dir: Path) -> str:
     """(Phase 2: Digest용) TOON 포맷 생성기 (Placeholder)"""
     return "# TOON generation logic here"
 
+# Directory trie: name -> child trie (directory) or None (file)
+_Trie = dict[str, Optional[dict]]
+
+def _build_trie(paths: list[Path], root_dir: Path) -> _Trie:
+    """Single pass over the scanned paths. Files outside root_dir are not shown."""
+    trie: _Trie = {}
+    for path in paths:
+        try:
+            parts = path.relative_to(root_dir).parts
+        except ValueError:
+            continue
+        if not parts:
+            continue
+
+        node = trie
+        for part in parts[:-1]:
+            child = node.get(part)
+            if child is None:
+                child = node[part] = {}
+            node = child
+        node.setdefault(parts[-1], None)
+    return trie
+
+def iter_ascii_tree(paths: list[Path], root_dir: Path) -> Iterator[str]:
+    """
+    Streaming variant: yields tree lines one by one.
+    Built from the already-scanned paths only (no filesystem access).
+    """
+    trie = _build_trie(paths, root_dir)
+
+    def _sorted(node: _Trie) -> list[tuple[str, Optional[dict]]]:
+        return sorted(node.items(), key=lambda item: item[0])
+
+    # Explicit stack of (children, next index, prefix) instead of recursion
+    stack = [(_sorted(trie), 0, "")]
+    while stack:
+        items, i, prefix = stack.pop()
+        if i >= len(items):
+            continue
+        stack.append((items, i + 1, prefix))
+
+        name, child = items[i]
+        is_last = (i == len(items) - 1)
+        connector = "└── " if is_last else "├── "
+        yield f"{prefix}{connector}{name}"
+
+        if child is not None:
+            extension = "    " if is_last else "│   "
+            stack.append((_sorted(child), 0, prefix + extension))
+
 def generate_ascii_tree(paths: list[Path], root_dir: Path) -> str:
     """
     [Legacy Style] Generates a standard ASCII directory tree.
     Ref: Ported from original codigest prototype.
+    Rendered from a prefix trie of the scanned paths, linear in the number of files.
     """
-    lines = []
-    # Set for fast lookup
-    path_set = set(paths)
-    
-    def _walk(current_path: Path, prefix: str = ""):
-        try:
-            # 현재 디렉토리의 모든 항목 가져오기
-            all_items = sorted(current_path.iterdir(), key=lambda x: x.name)
-        except PermissionError:
-            return
-
-        # 필터링: 스캔된 파일이거나, 스캔된 파일을 포함하는 디렉토리여야 함
-        filtered_items = []
-        for item in all_items:
-            if item.is_file():
-                if item in path_set:
-                    filtered_items.append(item)
-            elif item.is_dir():
-                # 디렉토리 안에 유효한 파일이 하나라도 있는지 확인 (Deep Check)
-                # 성능 최적화를 위해 문자열 startswith 체크
-                item_str = str(item)
-                if any(str(p).startswith(item_str) for p in path_set):
-                    filtered_items.append(item)
-
-        count = len(filtered_items)
-        for i, item in enumerate(filtered_items):
-            is_last = (i == count - 1)
-            connector = "└── " if is_last else "├── "
-            
-            lines.append(f"{prefix}{connector}{item.name}")
-            
-            if item.is_dir():
-                extension = "    " if is_last else "│   "
-                _walk(item, prefix + extension)
-
-    _walk(root_dir)
-    return "\n".join(lines)
\ No newline at end of file
+    return "\n".join(iter_ascii_tree(paths, root_dir))
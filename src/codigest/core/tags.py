@@ -3,9 +3,12 @@ Core Template Engine & XML Factory.
 Centralizes XML escaping and block generation logic.
 """
 import html
+import re
 import textwrap
 from typing import Any
 
+_WHITESPACE_ONLY_LINE = re.compile(r"^[ \t]+$", re.MULTILINE)
+
 def escape_xml_value(value: Any) -> str:
     """[XML] Escapes characters for XML safety."""
     raw_value = str(value)
@@ -20,6 +23,13 @@ def dedent(template: str) -> str:
         template = str(template)
     return textwrap.dedent(template.expandtabs(4)).strip()
 
+def normalize_ws(chunk: str) -> str:
+    """
+    [Plain] The per-line part of dedent(): expands tabs and blanks whitespace-only lines.
+    Applied to streamed chunks so they match what dedent() does to a full template.
+    """
+    return _WHITESPACE_ONLY_LINE.sub("", chunk.expandtabs(4))
+
 def xml(template: str) -> str:
     """[XML] Wrapper for dedent (legacy support)."""
     return dedent(template)
@@ -0,0 +1,89 @@
+"""
+In-process Unified Diff Renderer.
+Produces git-style (--no-prefix) diff sections from blob contents,
+so the anchor never has to materialize files for `git diff --no-index`.
+"""
+import difflib
+from typing import Optional
+
+# git's heuristic: a NUL byte in the first 8000 bytes means binary
+_BINARY_SNIFF = 8000
+_NO_NEWLINE = "\\ No newline at end of file\n"
+
+
+def is_binary(data: bytes) -> bool:
+    return b"\0" in data[:_BINARY_SNIFF]
+
+
+def _split_lines(data: bytes) -> list[str]:
+    """Splits on '\n' only (like git); the last line keeps no terminator if the file has none."""
+    text = data.decode("utf-8", errors="replace")
+    if not text:
+        return []
+    lines = [line + "\n" for line in text.split("\n")]
+    if text.endswith("\n"):
+        lines.pop()
+    else:
+        lines[-1] = lines[-1][:-1]
+    return lines
+
+
+def unified_diff(
+    path: str,
+    old: Optional[bytes],
+    new: Optional[bytes],
+    old_oid: str = "",
+    new_oid: str = "",
+    mode: str = "100644",
+    context: int = 3
+) -> str:
+    """
+    One file section. old=None means added, new=None means deleted.
+    Returns "" if the contents are identical.
+    """
+    if old == new:
+        return ""
+
+    old_name = path if old is not None else "/dev/null"
+    new_name = path if new is not None else "/dev/null"
+    header = [f"diff --git {path} {path}\n"]
+    if old is None:
+        header.append(f"new file mode {mode}\n")
+        header.append(f"index 0000000..{new_oid[:7]}\n")
+    elif new is None:
+        header.append(f"deleted file mode {mode}\n")
+        header.append(f"index {old_oid[:7]}..0000000\n")
+    else:
+        header.append(f"index {old_oid[:7]}..{new_oid[:7]} {mode}\n")
+
+    old_data = old or b""
+    new_data = new or b""
+    if is_binary(old_data) or is_binary(new_data):
+        header.append(f"Binary files {old_name} and {new_name} differ\n")
+        return "".join(header)
+
+    header.append(f"--- {old_name}\n")
+    header.append(f"+++ {new_name}\n")
+
+    hunks = difflib.unified_diff(_split_lines(old_data), _split_lines(new_data), n=context, lineterm="\n")
+    body = []
+    for i, line in enumerate(hunks):
+        if i < 2:
+            # difflib's own ---/+++ lines
+            continue
+        if line.endswith("\n"):
+            body.append(line)
+        else:
+            body.append(line + "\n" + _NO_NEWLINE)
+
+    return "".join(header + body)
+
+
+def rename_header(old_path: str, new_path: str) -> str:
+    """Section for an exact (content-identical) rename."""
+    return (
+        f"diff --git {old_path} {new_path}\n"
+        "similarity index 100%\n"
+        f"rename from {old_path}\n"
+        f"rename to {new_path}\n"
+    )
@@ -0,0 +1,126 @@
+"""
+Directory Walker Engine.
+os.scandir based traversal: file types come from the cached DirEntry data,
+ignored directories are pruned before descending, and subtrees can be
+fanned out across a thread pool (scandir releases the GIL).
+Directory listings can be served from a ScanIndex (see core/index.py).
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Callable, Optional
+from loguru import logger
+
+# (relative posix path, is_dir) -> ignored?
+IgnoreFunc = Callable[[str, bool], bool]
+# Path -> keep?
+FileFilter = Callable[[Path], bool]
+# (name, is_dir, is_file), sorted by name
+DirListing = list[tuple[str, bool, bool]]
+
+
+def list_directory(directory: Path) -> DirListing:
+    """Single scandir pass. Raises OSError if the directory cannot be read."""
+    listing = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir()
+                is_file = not is_dir and entry.is_file()
+            except OSError:
+                continue
+            listing.append((entry.name, is_dir, is_file))
+    listing.sort(key=lambda item: item[0])
+    return listing
+
+
+class DirectoryWalker:
+    def __init__(
+            self,
+            root_path: Path,
+            is_ignored: IgnoreFunc,
+            accept_file: FileFilter,
+            workers: int = 1,
+            index=None
+            ):
+        self.root_path = root_path
+        self.is_ignored = is_ignored
+        self.accept_file = accept_file
+        self.workers = max(1, workers)
+        # Optional ScanIndex: serves listings of directories whose mtime is unchanged
+        self.index = index
+
+    def _rel_prefix(self, directory: Path) -> Optional[str]:
+        """Relative posix prefix of a start directory ("" for root, None if outside root)."""
+        try:
+            rel = directory.relative_to(self.root_path).as_posix()
+        except ValueError:
+            return None
+        return "" if rel == "." else rel + "/"
+
+    def _scan_dir(self, directory: Path, prefix: Optional[str]) -> tuple[list[Path], list[tuple[Path, Optional[str]]]]:
+        """
+        Lists a single directory.
+        Returns (accepted files, subdirectories to descend into).
+        """
+        files = []
+        subdirs = []
+        try:
+            if self.index is not None:
+                entries = self.index.list_dir(directory)
+            else:
+                entries = list_directory(directory)
+        except OSError as e:
+            logger.debug(f"Cannot scan {directory}: {e}")
+            return files, subdirs
+
+        for name, is_dir, is_file in entries:
+            # Paths outside the root are never matched against ignore rules
+            if prefix is not None:
+                rel = prefix + name
+                if self.is_ignored(rel + "/" if is_dir else rel, is_dir):
+                    continue
+
+            path = directory / name
+            if is_dir:
+                subdirs.append((path, None if prefix is None else f"{prefix}{name}/"))
+            elif is_file and self.accept_file(path):
+                files.append(path)
+
+        return files, subdirs
+
+    def walk(self, start_dirs: list[Path]) -> list[Path]:
+        """
+        Walks every start directory and returns the accepted files.
+        Order depends on task completion; callers sort the merged result.
+        """
+        pending = [(d, self._rel_prefix(d)) for d in start_dirs]
+        if self.workers == 1:
+            return self._walk_serial(pending)
+        return self._walk_parallel(pending)
+
+    def _walk_serial(self, pending: list[tuple[Path, Optional[str]]]) -> list[Path]:
+        results = []
+        while pending:
+            directory, prefix = pending.pop()
+            files, subdirs = self._scan_dir(directory, prefix)
+            results.extend(files)
+            pending.extend(subdirs)
+        return results
+
+    def _walk_parallel(self, pending: list[tuple[Path, Optional[str]]]) -> list[Path]:
+        """
+        Work-queue fan out: every directory is one task, and the subdirectories
+        it yields are submitted from the main thread (no nested waits, no deadlock).
+        """
+        results = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self._scan_dir, d, p) for d, p in pending}
+            while futures:
+                done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, subdirs = future.result()
+                    results.extend(files)
+                    for d, p in subdirs:
+                        futures.add(executor.submit(self._scan_dir, d, p))
+        return results
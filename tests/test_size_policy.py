@@ -0,0 +1,57 @@
+"""large_file_policy = "skip" applies to every command, not just scan."""
+import json
+from pathlib import Path
+
+import pytest
+
+from codigest.commands import diff, scan
+from codigest.core import common
+
+CONFIG = """\
+[filter]
+extensions = [".py", ".json"]
+max_file_size_kb = 100
+large_file_policy = "skip"
+"""
+
+
+@pytest.fixture
+def project(tmp_path: Path, monkeypatch) -> Path:
+    (tmp_path / ".codigest").mkdir()
+    (tmp_path / ".codigest" / "config.toml").write_text(CONFIG, encoding="utf-8")
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "app.py").write_text("def f():\n    return 1\n", encoding="utf-8")
+    rows = [{"id": i, "value": "x" * 20} for i in range(9000)]
+    (src / "data.json").write_text(json.dumps(rows, indent=1), encoding="utf-8")
+    assert (src / "data.json").stat().st_size > 100 * 1024
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def _scan():
+    scan.handle(
+        targets=None, output="snapshot.xml", all=False, message="", line_numbers=False,
+        yes=True, resolve=False, max_depth=None, token_budget=None, max_tokens=None,
+        shard_tokens=None, shard_kb=None
+    )
+
+
+def test_skipped_files_leave_the_file_list(project: Path):
+    ctx = common.get_context(project)
+    files = ctx.get_target_files()
+    assert project / "src" / "app.py" in files
+    assert project / "src" / "data.json" not in files
+    assert ctx.skipped_files == [project / "src" / "data.json"]
+
+
+def test_scan_then_diff_reports_no_changes(project: Path):
+    _scan()
+    snapshot = (project / ".codigest" / "snapshot.xml").read_text(encoding="utf-8")
+    assert "data.json" not in snapshot
+
+    ctx = common.get_context(project)
+    assert ctx.get_anchor().get_changes(ctx.get_target_files()) == ""
+
+    diff.handle(target=project, copy=False, save=True, message="", resolve=False)
+    assert not (project / ".codigest" / "changes.diff").exists()